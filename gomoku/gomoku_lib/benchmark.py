@@ -0,0 +1,188 @@
+# encoding: utf-8
+import json
+import time
+import tracemalloc
+from .state import State
+from .move import Move
+from .minimax import minimax
+from .heuristic import evaluate
+from .stats import SearchStats
+
+inf = float('inf')
+
+# Posicoes fixas usadas pelo benchmark, como jogadas (y, x) a partir do
+# estado inicial. Mudar o corpus invalida a comparacao com resultados antigos
+CORPUS = {
+    "opening": [(7, 7), (7, 6), (6, 6)],
+    "opening_diagonal": [(7, 7), (6, 6), (8, 6), (6, 8)],
+    "middlegame": [(7, 7), (7, 6), (6, 6), (5, 5), (7, 5), (5, 7), (5, 8),
+                   (6, 8), (8, 8), (9, 9), (8, 6), (8, 7)],
+    "middlegame_spread": [(7, 7), (6, 8), (8, 8), (6, 6), (6, 7), (5, 8),
+                          (8, 6), (9, 5), (7, 9), (4, 9), (8, 7), (8, 5),
+                          (9, 7), (7, 5)],
+    "tactical_open_three": [(7, 7), (0, 0), (7, 8), (0, 2), (7, 9), (14, 14)],
+    "tactical_four": [(7, 7), (7, 6), (8, 8), (6, 6), (9, 9), (5, 5),
+                      (10, 10), (4, 4)],
+}
+MINIMAX_DEPTHS = (1, 2, 3)
+# Numero de repeticoes das medidas de cada operacao
+REPEAT = 50
+BENCHMARK_VERSION = 1
+
+
+def summarize(latencies):
+    """
+    Retorna a mediana, o percentil 95 e a media das latencias (segundos)
+    """
+    latencies = sorted(latencies)
+    p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    return {
+        "count": len(latencies),
+        "median": latencies[len(latencies) // 2],
+        "p95": p95,
+        "mean": sum(latencies) / len(latencies)
+    }
+
+
+def measure_allocation(fn):
+    """
+    Retorna o pico de memoria (bytes) alocada por uma chamada de fn,
+    medido com o tracemalloc
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - before
+
+
+def measure(fn, repeat=REPEAT):
+    """
+    Executa fn repeat vezes e retorna o resumo das latencias e a alocacao de
+    uma chamada
+    """
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    result = summarize(latencies)
+    result["allocated"] = measure_allocation(fn)
+    return result
+
+
+def benchmark_minimax(state, depth):
+    stats = SearchStats()
+    started = time.perf_counter()
+    minimax(state.player, state, depth, -inf, inf, True, stats=stats)
+    elapsed = time.perf_counter() - started
+    return {
+        "depth": depth,
+        "nodes": stats.nodes,
+        "time": elapsed,
+        "nodes_per_second": stats.nodes / elapsed,
+        "stats": stats.as_dict(),
+        "allocated": measure_allocation(
+            lambda: minimax(state.player, state, depth, -inf, inf, True))
+    }
+
+
+def benchmark_sequence_cache(state):
+    """
+    Gera as jogadas e avalia cada filho de state, o trabalho que os estados
+    fazem com count_blocked e count_near_merge, e soma os acertos e falhas
+    dos caches (SequenceCache) dos filhos
+    """
+    hits = misses = 0
+    for child in state.get_next_states():
+        list(child.get_next_moves())
+        evaluate(state.player, child)
+        hits += child.cache.hits
+        misses += child.cache.misses
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / float(total) if total else 0.0
+    }
+
+
+def benchmark_position(state, depths=MINIMAX_DEPTHS, repeat=REPEAT):
+    """
+    Mede cada operacao do motor na posicao state
+    """
+    moves = list(state.get_next_moves())
+    y, x = moves[0]
+    move = Move(y, x, state.player)
+    return {
+        "move_count": state.move_count,
+        "evaluate": measure(lambda: evaluate(state.player, state), repeat),
+        "get_next_states": measure(
+            lambda: list(state.get_next_states()), repeat),
+        "mark": measure(lambda: state.mark(y, x), repeat),
+        "sequences_append": measure(
+            lambda: state.sequences.append(state, move), repeat),
+        "sequence_cache": benchmark_sequence_cache(state),
+        "minimax": [benchmark_minimax(state, depth) for depth in depths]
+    }
+
+
+def run_benchmark(depths=MINIMAX_DEPTHS, repeat=REPEAT, names=None):
+    """
+    Executa o benchmark em todas as posicoes do corpus (ou nas informadas
+    em names) e retorna um dicionario que pode ser escrito em JSON
+    """
+    positions = {}
+    for name in sorted(CORPUS):
+        if names and name not in names:
+            continue
+        state = State.from_moves(CORPUS[name])
+        positions[name] = benchmark_position(state, depths, repeat)
+    return {
+        "version": BENCHMARK_VERSION,
+        "created_at": time.time(),
+        "depths": list(depths),
+        "repeat": repeat,
+        "positions": positions
+    }
+
+
+def format_report(results):
+    lines = []
+    for name, position in sorted(results["positions"].items()):
+        lines.append("%s (%d moves)" % (name, position["move_count"]))
+        for operation in ("evaluate", "get_next_states", "mark",
+                          "sequences_append"):
+            result = position[operation]
+            lines.append(
+                "  %-17s median %9.1fus  p95 %9.1fus  %8d bytes" % (
+                    operation, result["median"] * 1e6, result["p95"] * 1e6,
+                    result["allocated"]))
+        cache = position["sequence_cache"]
+        lines.append("  sequence cache    %d hits  %d misses  %.0f%% hits" % (
+            cache["hits"], cache["misses"], cache["hit_rate"] * 100))
+        for result in position["minimax"]:
+            lines.append(
+                "  minimax depth %d  %7d nodes  %8.0f nodes/s  %8d bytes" % (
+                    result["depth"], result["nodes"],
+                    result["nodes_per_second"], result["allocated"]))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark do motor")
+    parser.add_argument("--output", help="arquivo JSON com os resultados")
+    parser.add_argument("--depths", type=int, nargs="*",
+                        default=list(MINIMAX_DEPTHS))
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--positions", nargs="*", default=None,
+                        help="nomes das posicoes do corpus (todas por padrao)")
+    args = parser.parse_args()
+    results = run_benchmark(args.depths, args.repeat, args.positions)
+    print(format_report(results))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
@@ -0,0 +1,141 @@
+# encoding: utf-8
+import collections
+import functools
+from .constants import ALL_DIRECTIONS, EMPTY, X_PLAYER, O_PLAYER
+from .sequence import VECTORS
+
+
+def _get_ray(geometry, direction, n):
+    """
+    Retorna a mascara relativa das casas alcancadas andando de 1 a n passos
+    na direcao, e o deslocamento (shift) dela: para a casa c, os bits do raio
+    sao (bits >> (c + shift)) & mask
+    """
+    dy, dx = VECTORS[direction]
+    step = dy * geometry.width + dx
+    offsets = [step * k for k in range(1, n + 1)]
+    shift = min(offsets)
+    mask = 0
+    for offset in offsets:
+        mask |= 1 << (offset - shift)
+    return shift, mask
+
+
+@functools.lru_cache(maxsize=None)
+def get_rays(geometry):
+    """
+    Pre-calcula, para cada direcao, os raios (veja _get_ray) de 1 a
+    geometry.winning - 1 passos, o maior numero de passos usado por Sequence.
+    Os raios so dependem da direcao e da largura do tabuleiro, e nao da casa,
+    entao as tabelas nao crescem com a area
+    """
+    return {
+        direction: tuple(_get_ray(geometry, direction, n)
+                         for n in range(1, geometry.winning))
+        for direction in ALL_DIRECTIONS
+    }
+
+
+BaseBitboard = collections.namedtuple(
+    "BaseBitboard", ["x_bits", "o_bits", "geometry", "rays"])
+
+
+class Bitboard(BaseBitboard):
+    """
+    Representacao compacta do tabuleiro: um inteiro por jogador, onde o bit
+    geometry.cell_index(y, x) indica se a casa (y, x) foi marcada por ele.
+    Os inteiros do Python so usam a memoria dos bits ate a ultima peca
+    marcada, entao tabuleiros grandes e quase vazios continuam pequenos
+    """
+
+    @classmethod
+    def get_empty(cls, geometry):
+        return cls(x_bits=0, o_bits=0, geometry=geometry,
+                   rays=get_rays(geometry))
+
+    def get_bits(self, player):
+        if player == X_PLAYER:
+            return self.x_bits
+        elif player == O_PLAYER:
+            return self.o_bits
+        return 0
+
+    def get_opponent_bits(self, player):
+        if player == X_PLAYER:
+            return self.o_bits
+        return self.x_bits
+
+    def occupied(self):
+        return self.x_bits | self.o_bits
+
+    def mark(self, y, x, player):
+        bit = 1 << self.geometry.cell_index(y, x)
+        if player == X_PLAYER:
+            return self._replace(x_bits=self.x_bits | bit)
+        return self._replace(o_bits=self.o_bits | bit)
+
+    def is_marked(self, y, x):
+        return bool((self.x_bits | self.o_bits) >>
+                    self.geometry.cell_index(y, x) & 1)
+
+    def is_marked_by(self, y, x, player):
+        return bool(self.get_bits(player) >>
+                    self.geometry.cell_index(y, x) & 1)
+
+    def get(self, y, x):
+        cell = self.geometry.cell_index(y, x)
+        if self.x_bits >> cell & 1:
+            return X_PLAYER
+        if self.o_bits >> cell & 1:
+            return O_PLAYER
+        return EMPTY
+
+    def get_ray(self, direction, n):
+        """
+        Retorna o raio (shift, mask) de n passos na direcao (veja _get_ray)
+        """
+        rays = self.rays[direction]
+        if n <= len(rays):
+            return rays[n - 1]
+        return _get_ray(self.geometry, direction, n)
+
+    def is_line_blocked(self, y, x, direction, n, player):
+        """
+        Retorna verdadeiro se, andando ate n passos na direcao a partir de
+        (y, x), encontramos a borda do tabuleiro ou uma peca do adversario
+        """
+        if n <= 0:
+            return False
+        geometry = self.geometry
+        dy, dx = VECTORS[direction]
+        if not (0 <= y + n * dy < geometry.height and
+                0 <= x + n * dx < geometry.width):
+            return True
+        shift, mask = self.get_ray(direction, n)
+        if player == X_PLAYER:
+            bits = self.o_bits
+        else:
+            bits = self.x_bits
+        return bool(bits >> (y * geometry.width + x + shift) & mask)
+
+    def has_line_piece(self, y, x, direction, n, player):
+        """
+        Retorna verdadeiro se ha uma peca do jogador em ate n passos na
+        direcao a partir de (y, x)
+        """
+        geometry = self.geometry
+        dy, dx = VECTORS[direction]
+        # Apenas os passos que ficam dentro do tabuleiro
+        if dy > 0:
+            n = min(n, geometry.height - 1 - y)
+        elif dy < 0:
+            n = min(n, y)
+        if dx > 0:
+            n = min(n, geometry.width - 1 - x)
+        elif dx < 0:
+            n = min(n, x)
+        if n <= 0:
+            return False
+        shift, mask = self.get_ray(direction, n)
+        return bool(self.get_bits(player) >>
+                    (y * geometry.width + x + shift) & mask)
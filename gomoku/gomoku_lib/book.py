@@ -0,0 +1,213 @@
+# encoding: utf-8
+import mmap
+import os
+import struct
+from .minimax import iterative_deepening
+from .negamax import principal_variation
+from .transposition import TranspositionTable
+from .ordering import MoveOrdering
+from .exceptions import InvalidBook
+from .geometry import DEFAULT_GEOMETRY
+
+# Formato do arquivo: cabecalho (MAGIC, versao, numero de registros) seguido
+# dos registros ordenados pelo hash da posicao
+MAGIC = b"GMKB"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+# Registro: hash (zobrist) da posicao, casa (y, x) da jogada e peso (quantas
+# vezes a jogada foi escolhida na construcao do livro)
+RECORD = struct.Struct("<QBBH")
+MAX_WEIGHT = 0xffff
+
+# Parametros padrao da construcao do livro
+BOOK_PLIES = 4
+BOOK_REPLIES = 3
+BOOK_BUDGET = 5.0
+
+
+class OpeningBook(object):
+    """
+    Livro de aberturas somente leitura. O arquivo eh mapeado em memoria e
+    cada consulta eh uma busca binaria sobre os registros, sem carrega-lo
+    inteiro
+    """
+    __slots__ = ["file", "map", "size"]
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except ValueError:
+            # Arquivos vazios nao podem ser mapeados
+            self.file.close()
+            raise InvalidBook(path)
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise InvalidBook(path)
+        magic, version, size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or \
+                len(self.map) != HEADER.size + size * RECORD.size:
+            self.close()
+            raise InvalidBook(path)
+        self.size = size
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return self.size
+
+    def get_record(self, number):
+        return RECORD.unpack_from(self.map, HEADER.size + number * RECORD.size)
+
+    def find(self, key):
+        """
+        Retorna o numero do primeiro registro com o hash key, ou o numero
+        onde ele estaria
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_record(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_moves(self, key):
+        """
+        Retorna as jogadas ((y, x), peso) guardadas para o hash key
+        """
+        moves = []
+        number = self.find(key)
+        while number < self.size:
+            record_key, y, x, weight = self.get_record(number)
+            if record_key != key:
+                break
+            moves.append(((y, x), weight))
+            number += 1
+        return moves
+
+    def probe(self, state):
+        """
+        Retorna a jogada (y, x) de maior peso para state, ou None se a posicao
+        nao esta no livro. Jogadas invalidas (colisao de hash) sao ignoradas.
+        O livro eh construido no tabuleiro padrao, entao partidas com outra
+        geometria nao o consultam
+        """
+        if state.geometry != DEFAULT_GEOMETRY:
+            return None
+        best = None
+        for (y, x), weight in self.get_moves(state.zobrist):
+            if not state.is_valid_position(y, x) or state.is_marked(y, x):
+                continue
+            if best is None or weight > best[1]:
+                best = (y, x), weight
+        if best is None:
+            return None
+        return best[0]
+
+
+def load_book(path):
+    """
+    Abre o livro em path, ou retorna None se ele nao existe
+    """
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def write_book(path, entries):
+    """
+    Escreve o livro a partir de um dicionario {(hash, (y, x)): peso}
+    """
+    records = sorted(entries.items())
+    with open(path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        for (key, (y, x)), weight in records:
+            book_file.write(RECORD.pack(key, y, x, min(weight, MAX_WEIGHT)))
+
+
+def get_best_move(state, budget):
+    """
+    Busca a melhor jogada de state com aprofundamento iterativo
+    """
+    value, best_state = iterative_deepening(
+        state.player, state, budget, TranspositionTable(),
+        ordering=MoveOrdering(), search=principal_variation)
+    move = best_state.last_move
+    return move.y, move.x
+
+
+def build_book(state, plies=BOOK_PLIES, replies=BOOK_REPLIES,
+               budget=BOOK_BUDGET, entries=None):
+    """
+    Constroi as entradas do livro a partir de state: cada posicao recebe a
+    melhor jogada encontrada com budget segundos de busca, e a arvore segue
+    por essa jogada e pelas replies primeiras jogadas candidatas, ate plies
+    jogadas de profundidade
+    """
+    if entries is None:
+        entries = {}
+    if plies <= 0 or state.finished():
+        return entries
+    best = get_best_move(state, budget)
+    key = (state.zobrist, best)
+    entries[key] = entries.get(key, 0) + 1
+    moves = [best]
+    for move in state.get_next_moves():
+        if len(moves) > replies:
+            break
+        if move not in moves:
+            moves.append(move)
+    for move in moves:
+        build_book(state.mark(*move), plies - 1, replies, budget, entries)
+    return entries
+
+
+def add_game(entries, moves, winner):
+    """
+    Adiciona ao livro as jogadas do vencedor de uma partida (lista de
+    jogadas (y, x), como em State.get_moves)
+    """
+    from .state import State
+    state = State.get_initial_state()
+    for move in moves:
+        if state.player == winner:
+            key = (state.zobrist, tuple(move))
+            entries[key] = entries.get(key, 0) + 1
+        state = state.mark(*move)
+    return entries
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from .state import State
+    parser = argparse.ArgumentParser(
+        description="Constroi um livro de aberturas")
+    parser.add_argument("output")
+    parser.add_argument("--plies", type=int, default=BOOK_PLIES)
+    parser.add_argument("--replies", type=int, default=BOOK_REPLIES)
+    parser.add_argument("--budget", type=float, default=BOOK_BUDGET)
+    parser.add_argument(
+        "--games", nargs="*", default=[],
+        help="arquivos JSONL de partidas ({\"moves\": ..., \"winner\": ...})")
+    parser.add_argument("--max-moves", type=int, default=BOOK_PLIES * 2,
+                        help="jogadas de cada partida usadas no livro")
+    args = parser.parse_args()
+    entries = {}
+    if args.plies > 0:
+        build_book(State.get_initial_state(), args.plies, args.replies,
+                   args.budget, entries)
+    for path in args.games:
+        with open(path) as games:
+            for line in games:
+                game = json.loads(line)
+                if game.get("winner"):
+                    add_game(entries, game["moves"][:args.max_moves],
+                             game["winner"])
+    write_book(args.output, entries)
+    print("%d entries written to %s" % (len(entries), args.output))
@@ -0,0 +1,45 @@
+# encoding: utf-8
+
+# Propriedades de Sequence guardadas no cache
+COUNT_BLOCKED = 0
+COUNT_NEAR_MERGE = 1
+
+
+class SequenceCache(object):
+    """
+    Cache das propriedades de sequencias calculadas para um State. Cada State
+    tem o seu, que eh liberado junto com ele, com os seus contadores de
+    acertos e falhas (somados pelo benchmark, veja
+    benchmark.benchmark_sequence_cache)
+    """
+    __slots__ = ["values", "hits", "misses"]
+
+    def __init__(self):
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, prop, sequence, n):
+        """
+        Retorna a propriedade prop da sequencia, ou None se ela ainda nao foi
+        calculada para este State. A sequencia eh indexada pela sua chave
+        canonica (veja Sequence.get_key)
+        """
+        value = self.values.get((prop, sequence, n))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, prop, sequence, n, value):
+        self.values[(prop, sequence, n)] = value
+
+    def get_hit_rate(self):
+        total = self.hits + self.misses
+        if not total:
+            return 0.0
+        return self.hits / float(total)
@@ -0,0 +1,103 @@
+# encoding: utf-8
+
+# Cada no da arvore de CellMap tem 2 ** BITS filhos
+BITS = 5
+MASK = (1 << BITS) - 1
+
+
+def _update(node, shift, items):
+    """
+    Retorna uma copia de node com os valores (casa, valor) de items. Apenas
+    os nos no caminho das casas alteradas sao copiados; um no sem valores
+    vira None
+    """
+    children = list(node) if node is not None else [None] * (MASK + 1)
+    if shift == 0:
+        for cell, value in items:
+            children[cell & MASK] = value or None
+    else:
+        groups = {}
+        for item in items:
+            groups.setdefault(item[0] >> shift & MASK, []).append(item)
+        for number, group in groups.items():
+            children[number] = _update(children[number], shift - BITS, group)
+    if not any(children):
+        return None
+    return tuple(children)
+
+
+class CellMap(object):
+    """
+    Dicionario persistente casa (cell_index) -> tupla, como uma arvore de
+    tuplas de 2 ** BITS posicoes. Alterar algumas casas (update) cria um novo
+    CellMap que copia apenas os nos no caminho delas e compartilha o resto
+    com o anterior, entao o custo nao depende do numero de casas com valores.
+    Casas sem valor retornam ()
+    """
+    __slots__ = ["root", "shift"]
+
+    def __init__(self, root, shift):
+        self.root = root
+        self.shift = shift
+
+    @classmethod
+    def get_empty(cls, geometry):
+        shift = 0
+        while geometry.size > 1 << (shift + BITS):
+            shift += BITS
+        return cls(None, shift)
+
+    def get(self, cell, default=()):
+        node = self.root
+        shift = self.shift
+        while node is not None:
+            node = node[cell >> shift & MASK]
+            if shift == 0:
+                break
+            shift -= BITS
+        if node is None:
+            return default
+        return node
+
+    def __getitem__(self, cell):
+        return self.get(cell)
+
+    def update(self, values):
+        """
+        Retorna um novo CellMap com os valores do dicionario values (casa ->
+        tupla, vazia para remover a casa)
+        """
+        if not values:
+            return self
+        return CellMap(_update(self.root, self.shift, list(values.items())),
+                       self.shift)
+
+
+class CellMapChanges(object):
+    """
+    Alteracoes acumuladas sobre um CellMap, lidas como se ja estivessem nele.
+    get_map cria o novo CellMap de uma vez
+    """
+    __slots__ = ["base", "values"]
+
+    def __init__(self, base):
+        self.base = base
+        self.values = {}
+
+    def get(self, cell, default=()):
+        value = self.values.get(cell)
+        if value is None:
+            value = self.base.get(cell)
+        return value or default
+
+    def __getitem__(self, cell):
+        return self.get(cell)
+
+    def __setitem__(self, cell, value):
+        self.values[cell] = value
+
+    def __delitem__(self, cell):
+        self.values[cell] = ()
+
+    def get_map(self):
+        return self.base.update(self.values)
@@ -1,4 +1,6 @@
 # encoding: utf-8
+# Geometria padrao (geometry.DEFAULT_GEOMETRY). Cada partida pode ter a
+# sua: veja geometry.Geometry
 # Largura do tabuleiro
 BOARD_WIDTH = 15
 # Altura do tabuleiro
@@ -2,14 +2,15 @@
 import curses
 import textwrap
 import time
-from .constants import BOARD_WIDTH, BOARD_HEIGHT
+from .geometry import DEFAULT_GEOMETRY
 from .events import Mouse, Key
 from .exceptions import Quit, GameWarning, StopPropagation, InvalidLocation
 
 
 class Display(object):
     __slots__ = [
-        "window", "handlers", "has_colors", "computer_player"
+        "window", "handlers", "has_colors", "computer_player", "search_stats",
+        "drawn_state", "drawn_panel", "status_key", "status_text", "geometry"
     ]
 
     MOUSE_EVENT = object()
@@ -18,9 +19,24 @@ class Display(object):
     POSDRAW_EVENT = object()
     MARK_EVENT = object()
     IA_MOVE = object()
+    # Disparado a cada volta do loop, com ou sem entrada do usuario: ao menos
+    # a cada 100ms (o timeout do getch)
+    IDLE_EVENT = object()
 
-    def __init__(self):
+    def __init__(self, geometry=DEFAULT_GEOMETRY):
         self.handlers = {}
+        # Geometria do tabuleiro desenhado (a mesma do State da partida)
+        self.geometry = geometry
+        # SearchStats da ultima busca da IA, mostrado junto com o status
+        self.search_stats = None
+        # O que ja esta na tela: o estado desenhado no tabuleiro e as linhas
+        # do painel lateral (linha da tela -> texto). draw so redesenha o que
+        # mudou desde entao
+        self.drawn_state = None
+        self.drawn_panel = {}
+        # Parte do status que so depende do estado e da ultima busca
+        self.status_key = None
+        self.status_text = None
 
     def initialize(self):
         self.window = curses.initscr()
@@ -31,6 +47,8 @@ class Display(object):
         self.window.keypad(1)
         curses.curs_set(0)
         self.window.timeout(100)
+        # Janela nova: o proximo draw desenha tudo
+        self.drawn_state = None
         self.has_colors = curses.can_change_color()
         if self.has_colors:
             curses.init_pair(1, curses.COLOR_BLACK, curses.COLOR_YELLOW)
@@ -71,10 +89,10 @@ class Display(object):
         return [y // 2, x // 2]
 
     def get_width(self):
-        return (BOARD_WIDTH * 2) - 1
+        return (self.geometry.width * 2) - 1
 
     def get_height(self):
-        return (BOARD_HEIGHT * 2) - 1
+        return (self.geometry.height * 2) - 1
 
     def format(self, message):
         width = self.get_width()
@@ -88,16 +106,22 @@ class Display(object):
         lines.append("=" * width)
         return lines
 
-    def display_message(self, message):
-        width = self.get_width()
-        height = self.get_height()
-        lines = self.format(message)
-        lines_count = len(lines)
-        for i, line in enumerate(lines):
-            self.window.addstr((height // 2) - ((lines_count // 2)) + i, width,
-                               line)
-
-    def display_status(self, state):
+    def get_status(self, state, with_search=True):
+        """
+        Retorna o texto do status, com as estatisticas da ultima busca se
+        with_search for verdadeiro. Apenas o tempo de jogo muda a cada
+        quadro: o resto eh recalculado quando o estado ou a ultima busca mudam
+        """
+        key = (state.history, state.player, self.search_stats)
+        if key != self.status_key:
+            message = "Pieces in board %d\n" % state.move_count
+            message += "Actual player: %s\n" % (state.player)
+            message += "Max Sequence: %d \n" % (
+                len(state.check_max_sequence()))
+            message += "Sequences found: %d \n" % (
+                len(state.get_sequences()))
+            self.status_key = key
+            self.status_text = message
         dif = time.time() - state.started_at
         dif_type = "seconds"
         if dif > 60:
@@ -106,45 +130,102 @@ class Display(object):
         if dif > 60:
             dif /= 60.0
             dif_type = "hours"
-        message = "Pieces in board %d\n" % state.move_count
-        message += "Actual player: %s\n" % (state.player)
-        message += "Max Sequence: %d \n" % (len(state.check_max_sequence()))
-        message += "Sequences found: %d \n" % (len(state.get_sequences()))
+        message = self.status_text
         message += "Playing for: %.2f %s" % (dif, dif_type)
-        
-        width = self.get_width()
-        lines = self.format(message)
-        lines_count = len(lines)
-        for i, line in enumerate(lines):
-            self.window.addstr(((lines_count // 2)) + i, width, line)
+        if with_search and self.search_stats is not None:
+            message += "\nLast search:\n" + self.search_stats.format()
+        return message
 
-    def draw(self, state):
+    def get_panel_lines(self, state):
+        """
+        Retorna as linhas (linha da tela -> texto) do painel ao lado do
+        tabuleiro: o status no topo e a mensagem logo abaixo dele, sem que um
+        cubra o outro. Se os dois nao cabem na altura do tabuleiro, as
+        estatisticas da ultima busca ficam de fora
+        """
+        height = self.get_height()
+        message = self.format(state.message) if state.message else []
+        status = self.format(self.get_status(state))
+        if len(status) + len(message) > height:
+            status = self.format(self.get_status(state, False))
+        return dict(enumerate((status + message)[:height]))
+
+    def draw_cell(self, y, x, state):
+        """
+        Desenha o caractere da posicao (y, x) da tela
+        """
+        char = self.get_char(y, x, state)
+        attr = None
+        if self.has_colors:
+            color_pair = 1
+            if char == "O":
+                color_pair = 2
+            elif char == "X":
+                color_pair = 3
+                char = "O"
+            attr = curses.color_pair(color_pair)
+        if char in ("O", "X"):
+            if attr is None:
+                attr = 0
+            attr = attr | curses.A_BOLD
+        if attr is not None:
+            self.window.addch(y, x, ord(char), attr)
+        else:
+            self.window.addch(y, x, ord(char))
+
+    def draw_board(self, state):
+        """
+        Desenha o tabuleiro inteiro, inclusive a grade, que nao muda depois
+        """
         width = self.get_width()
         height = self.get_height()
         self.window.erase()
+        self.drawn_panel = {}
         for x in range(width):
             for y in range(height):
-                char = self.get_char(y, x, state)
-                attr = None
-                if self.has_colors:
-                    color_pair = 1
-                    if char == "O":
-                        color_pair = 2
-                    elif char == "X":
-                        color_pair = 3
-                        char = "O"
-                    attr = curses.color_pair(color_pair)
-                if char in ("O", "X"):
-                    if attr is None:
-                        attr = 0
-                    attr = attr | curses.A_BOLD
-                if attr is not None:
-                    self.window.addch(y, x, ord(char), attr)
-                else:
-                    self.window.addch(y, x, ord(char))
-        if state.message:
-            self.display_message(state.message)
-        self.display_status(state)
+                self.draw_cell(y, x, state)
+
+    def draw_moves(self, old_state, state):
+        """
+        Redesenha apenas as posicoes em que old_state e state diferem. Como o
+        historico de um estado eh o de um anterior mais as jogadas novas (ou
+        uma parte dele, depois de desfazer), basta comparar o que vem depois
+        do prefixo comum
+        """
+        geometry = state.geometry
+        old = geometry.decode_history(old_state.history)
+        new = geometry.decode_history(state.history)
+        common = 0
+        limit = min(len(old), len(new))
+        while common < limit and old[common] == new[common]:
+            common += 1
+        for cell in set(old[common:]) | set(new[common:]):
+            y, x = geometry.get_position(cell)
+            self.draw_cell(y * 2, x * 2, state)
+
+    def draw_panel(self, state):
+        """
+        Desenha o status e a mensagem ao lado do tabuleiro (veja
+        get_panel_lines), escrevendo apenas as linhas da tela que mudaram
+        """
+        width = self.get_width()
+        panel = self.get_panel_lines(state)
+        for y in self.drawn_panel:
+            if y not in panel:
+                self.window.move(y, width)
+                self.window.clrtoeol()
+        for y, line in panel.items():
+            if self.drawn_panel.get(y) != line:
+                self.window.addstr(y, width, line)
+        self.drawn_panel = panel
+
+    def draw(self, state):
+        if self.drawn_state is None:
+            self.draw_board(state)
+        elif self.drawn_state.history != state.history:
+            self.draw_moves(self.drawn_state, state)
+        self.drawn_state = state
+        self.draw_panel(state)
         self.window.refresh()
 
     def on(self, event, fn):
@@ -272,6 +353,7 @@ class Display(object):
                         state = self.trigger(ev, state, *args)
                     except GameWarning as e:
                         state = state.display(str(e))
+                state = self.trigger(self.IDLE_EVENT, state)
                 state = self.trigger(self.PREDRAW_EVENT, state)
                 self.draw(state)
                 state = self.trigger(self.POSDRAW_EVENT, state)
@@ -46,3 +46,74 @@ class Quit(Exception):
     Emitir essa exceção faz o programa terminar sua execucao
     """
     pass
+
+
+class SearchTimeout(Exception):
+    """
+    Essa exceção é emitida quando a busca da IA estoura o tempo disponível
+    """
+    pass
+
+
+class SearchFailed(GameWarning):
+    """
+    Essa exceção é emitida quando a busca da IA em segundo plano falha
+    """
+
+    def __init__(self, error):
+        super(SearchFailed, self).__init__(
+            "The AI search failed ({}: {}), so it was done again".format(
+                type(error).__name__, error))
+
+
+class GameNotSaved(GameWarning):
+    """
+    Essa exceção é emitida quando a partida terminada não pode ser gravada
+    """
+
+    def __init__(self, path, error):
+        super(GameNotSaved, self).__init__(
+            "The game could not be saved to {} ({})".format(path, error))
+
+
+class InvalidGeometry(Exception):
+    """
+    Essa exceção é emitida quando as dimensões do tabuleiro ou o número de
+    peças para vencer são inválidos
+    """
+
+    def __init__(self, width, height, winning):
+        super(InvalidGeometry, self).__init__(
+            "Board {}x{} with {} in a row to win is not a valid board".format(
+                width, height, winning))
+
+
+class InvalidBook(Exception):
+    """
+    Essa exceção é emitida quando um arquivo de livro de aberturas é inválido
+    """
+
+    def __init__(self, path):
+        super(InvalidBook, self).__init__(
+            "File {} is not a valid opening book".format(path))
+
+
+class BookNotLoaded(GameWarning):
+    """
+    Essa exceção é emitida quando o livro de aberturas existe mas não pode
+    ser usado
+    """
+
+    def __init__(self, path, error):
+        super(BookNotLoaded, self).__init__(
+            "The opening book {} could not be used ({})".format(path, error))
+
+
+class InvalidRecord(Exception):
+    """
+    Essa exceção é emitida quando um arquivo de partidas gravadas é inválido
+    """
+
+    def __init__(self, path):
+        super(InvalidRecord, self).__init__(
+            "File {} is not a valid game record file".format(path))
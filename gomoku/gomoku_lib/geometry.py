@@ -0,0 +1,75 @@
+# encoding: utf-8
+import collections
+from .constants import BOARD_WIDTH, BOARD_HEIGHT, WINNING_CONDITION
+from .exceptions import InvalidGeometry
+
+# Menor numero de pecas para vencer: as ameacas de windows.Windows (quatros e
+# tres) tem winning - 1 e winning - 2 pecas
+MIN_WINNING = 3
+
+BaseGeometry = collections.namedtuple(
+    "BaseGeometry", ["width", "height", "winning"])
+
+
+class Geometry(BaseGeometry):
+    """
+    Dimensoes do tabuleiro e numero minimo de pecas em sequencia para vencer.
+    Cada partida (State) tem a sua. As tabelas pre-calculadas a partir dela
+    (janelas, linhas, chaves do zobrist...) sao criadas na primeira vez que
+    uma geometria eh usada e compartilhadas entre todas as partidas com ela:
+    cada modulo guarda as suas com functools.lru_cache, indexadas pela
+    geometria
+    """
+
+    def __new__(cls, width, height, winning):
+        if width < 1 or height < 1 or winning < MIN_WINNING or \
+                winning > max(width, height):
+            raise InvalidGeometry(width, height, winning)
+        return super(Geometry, cls).__new__(cls, width, height, winning)
+
+    @property
+    def size(self):
+        return self.width * self.height
+
+    @property
+    def cell_bytes(self):
+        """
+        Numero de bytes usados por casa em State.history: um no tabuleiro
+        15x15, para que o historico tenha um byte por jogada
+        """
+        if self.size <= 1 << 8:
+            return 1
+        if self.size <= 1 << 16:
+            return 2
+        return 4
+
+    def is_valid_position(self, y, x):
+        return y >= 0 and x >= 0 and y < self.height and x < self.width
+
+    def cell_index(self, y, x):
+        return y * self.width + x
+
+    def get_position(self, cell):
+        """
+        Retorna a casa (y, x) de um indice de cell_index
+        """
+        return divmod(cell, self.width)
+
+    def get_center(self):
+        return int(self.height / 2), int(self.width / 2)
+
+    def encode_cell(self, cell):
+        return cell.to_bytes(self.cell_bytes, "big")
+
+    def decode_history(self, history):
+        """
+        Retorna os indices das casas de um historico (como State.history)
+        """
+        size = self.cell_bytes
+        if size == 1:
+            return list(history)
+        return [int.from_bytes(history[i:i + size], "big")
+                for i in range(0, len(history), size)]
+
+
+DEFAULT_GEOMETRY = Geometry(BOARD_WIDTH, BOARD_HEIGHT, WINNING_CONDITION)
@@ -129,38 +129,126 @@ HEURISTIC = {
         }
     },
 }
+# Fatores de evaluate_sequence_blocking e evaluate_sequence_merging, pelo
+# numero de lados bloqueados ou quase unidos. Compartilhados com o
+# searchboard.SearchBoard, que avalia as sequencias sem criar um Sequence
+BLOCKING_VALUES = (128, 4, 1)
+MERGING_VALUES = (16, 8, 4)
+
+def evaluate_length(length):
+    return 8*(10**length)
+
+def evaluate_sides(length, sides_blocked, sides_merged):
+    """
+    Valor de uma sequencia de length pecas com sides_blocked lados
+    bloqueados e sides_merged lados quase unidos a outra
+    """
+    return evaluate_length(length) * \
+        (MERGING_VALUES[sides_merged] * BLOCKING_VALUES[sides_blocked])
+
 def evaluate_sequence_length(sequence):
-    l = len(sequence)
-    return 8*(10**l)
+    return evaluate_length(len(sequence))
 
 def evaluate_sequence_blocking(state, sequence):
-    sides_blocked = sequence.count_blocked(state)
-    if sides_blocked == 2:
-        return 1
-    elif sides_blocked == 1:
-        return 4
-    else:
-        return 128
+    return BLOCKING_VALUES[sequence.count_blocked(state)]
 
 def evaluate_sequence_merging(state, sequence):
-    sides_merged = sequence.count_near_merge(state)
-    if sides_merged == 2:
-        return 4
-    elif sides_merged == 1:
-        return 8
-    else:
-        return 16
+    return MERGING_VALUES[sequence.count_near_merge(state)]
 
 def evaluate_sequence(state, sequences, sequence):
-    l = len(sequence)
-    sides_merged = sequence.count_near_merge(state)
-    sides_blocked = sequence.count_blocked(state)
     # return HEURISTIC[l][sides_blocked][sides_merged]
-    return evaluate_sequence_length(sequence) * \
-        (evaluate_sequence_merging(state, sequence) * \
-        evaluate_sequence_blocking(state, sequence))
+    return evaluate_sides(len(sequence), sequence.count_blocked(state),
+                          sequence.count_near_merge(state))
+
+def combine_scores(score, next_score, move_count):
+    """
+    Valor da heuristica a partir das somas do jogador avaliado (score) e do
+    outro (next_score)
+    """
+    return int((score - (next_score*2))/float(move_count))
+
+def get_scores(state):
+    """
+    Calcula, do zero, a soma de evaluate_sequence das sequencias de cada
+    jogador
+    """
+    scores = {}
+    for seq in state.get_sequences():
+        scores[seq.player] = scores.get(seq.player, 0) + \
+            evaluate_sequence(state, None, seq)
+    return scores
+
+def update_scores(parent, state):
+    """
+    Atualiza as somas de parent para state, que difere dele apenas pela
+    ultima jogada: so as sequencias que tocam a casa jogada mudam de valor
+    """
+    move = state.last_move
+    scores = dict(parent.get_scores())
+    for seq in parent.get_sequences().get_by_touching(move.y, move.x):
+        scores[seq.player] = scores.get(seq.player, 0) - \
+            evaluate_sequence(parent, None, seq)
+    for seq in state.get_sequences().get_by_touching(move.y, move.x):
+        scores[seq.player] = scores.get(seq.player, 0) + \
+            evaluate_sequence(state, None, seq)
+    return scores
+
+class Scores(object):
+    """
+    Somas de evaluate_sequence das sequencias de cada jogador de um State,
+    calculadas na primeira vez que sao pedidas (State.get_scores). A busca
+    avalia no SearchBoard, entao a maioria dos estados nunca precisa delas e
+    State.mark nao paga por elas.
+
+    Se as somas do estado anterior (parent) ja existiam quando a jogada foi
+    feita, apenas as sequencias que tocam a jogada sao reavaliadas
+    (update_scores); senao, as somas sao calculadas do zero. Assim cada
+    estado guarda no maximo o anterior, e apenas ate as suas somas serem
+    calculadas
+    """
+    __slots__ = ["parent", "values"]
+
+    def __init__(self, parent=None, values=None):
+        self.parent = parent
+        self.values = values
+
+    def get(self, state):
+        if self.values is None:
+            parent = self.parent
+            if parent is None:
+                self.values = get_scores(state)
+            else:
+                self.values = update_scores(parent, state)
+            self.parent = None
+        return self.values
+
+    def get_child(self, state):
+        """
+        Retorna as somas (ainda nao calculadas) do estado seguinte a state
+        """
+        if self.values is None:
+            return Scores()
+        return Scores(state)
 
 def evaluate(player, state):
+    """
+    Avalia o estado do ponto de vista de player usando as somas de
+    State.get_scores, em O(1) depois da primeira vez
+    """
+    next_player = get_next_player(player, state)
+    scores = state.get_scores()
+    return combine_scores(scores.get(player, 0),
+                          scores.get(next_player, 0), state.move_count)
+
+def get_next_player(player, state):
+    if state.player == player:
+        return state.last_move.player
+    return state.player
+
+def evaluate_from_scratch(player, state):
+    """
+    Mesmo resultado de evaluate, mas percorrendo todas as sequencias
+    """
     sequences = state.get_sequences()
     if state.player == player:
         next_player = state.last_move.player
@@ -172,5 +260,4 @@ def evaluate(player, state):
     # cresult = cresult/float(len(computer))
     cplayer = sum(evaluate_sequence(state, player, seq) for seq in player)
     # cplayer = cplayer/float(len(player))
-    result = cresult-(cplayer*2)
-    return int(result/float(state.move_count))
+    return combine_scores(cresult, cplayer, state.move_count)
@@ -1,34 +1,241 @@
-from .heuristic import evaluate as evaluate_heuristic
-from .utility import evaluate as evaluate_utility
+import time
+from .transposition import EXACT, get_bound
+from .exceptions import SearchTimeout
+from .searchboard import SearchBoard
 
-def minimax(player, state, depth, alpha, beta, is_player):
-    finished = object()
-    next_states = state.get_next_states()
+inf = float('inf')
+# Profundidade maxima alcancada pelo aprofundamento iterativo
+MAX_DEPTH = 20
+# Jogada retornada pela busca quando o resultado eh o proprio no
+CURRENT = ()
+
+
+def get_ordered_moves(state, first_move=None, ordering=None, ply=0):
+    """
+    Gera as proximas jogadas (y, x), comecando por first_move quando ela for
+    valida. Os estados filhos nao sao criados aqui: a busca so marca as
+    jogadas que visita, entao as que sobram depois de um corte nao custam nada
+    """
+    if first_move is not None and not state.finished():
+        y, x = first_move
+        if state.is_valid_position(y, x) and not state.is_marked(y, x):
+            yield first_move
+        else:
+            first_move = None
+    moves = state.get_next_moves()
+    if ordering is not None:
+        moves = ordering.sort(moves, ply)
+    for move in moves:
+        if move != first_move:
+            yield move
+
+
+def next_timed(moves, finished, stats):
+    """
+    next(moves, finished), somando o tempo gasto a stats.generation_time
+    """
+    started = time.perf_counter()
+    move = next(moves, finished)
+    stats.generation_time += time.perf_counter() - started
+    return move
+
+
+def make_timed(board, move, stats):
+    started = time.perf_counter()
+    board.make_move(*move)
+    stats.mark_time += time.perf_counter() - started
+
+
+def unmake_timed(board, stats):
+    started = time.perf_counter()
+    board.unmake_move()
+    stats.mark_time += time.perf_counter() - started
+
+
+def get_result_state(state, move):
+    """
+    Converte a jogada retornada pela busca no tabuleiro no estado retornado
+    pelo minimax
+    """
+    if move is None:
+        return None
+    if move == CURRENT:
+        return state
+    return state.mark(*move)
+
+
+def minimax(player, state, depth, alpha, beta, is_player, table=None,
+            deadline=None, first_move=None, ordering=None, stats=None, ply=0,
+            cancel=None):
+    """
+    Busca a partir de state. A arvore eh percorrida num SearchBoard, com
+    make_move e unmake_move, e apenas o estado da jogada escolhida eh criado
+    """
+    board = SearchBoard.from_state(state)
+    value, move = search_board(player, board, depth, alpha, beta, is_player,
+                               table, deadline, first_move, ordering, stats,
+                               ply, cancel)
+    return value, get_result_state(state, move)
+
+
+def search_board(player, board, depth, alpha, beta, is_player, table=None,
+                 deadline=None, first_move=None, ordering=None, stats=None,
+                 ply=0, cancel=None):
+    """
+    Minimax com poda alfa-beta sobre um SearchBoard. Retorna o valor e a
+    melhor jogada: CURRENT quando o resultado eh o proprio no (folhas) e None
+    quando nenhuma jogada melhorou a janela.
 
-    best_state = None
-    next_state = next(next_states, finished)
+    cancel (um threading.Event) interrompe a busca como o fim do tempo
+    """
+    if deadline is not None and time.time() > deadline:
+        raise SearchTimeout()
+    if cancel is not None and cancel.is_set():
+        raise SearchTimeout()
+    if stats is not None:
+        stats.add_node(ply)
+    finished = object()
+    key = None
+    if table is not None:
+        key = table.get_key(board, player)
+        entry = table.get(key)
+        if entry is not None:
+            if entry.is_usable(depth, alpha, beta):
+                if entry.move is None:
+                    return entry.value, CURRENT
+                return entry.value, entry.move
+            if first_move is None:
+                first_move = entry.move
+    if depth == 0:
+        # Nas folhas as jogadas nem sao geradas
+        move = finished
+    else:
+        moves = get_ordered_moves(board, first_move, ordering, ply)
+        if stats is None:
+            move = next(moves, finished)
+        else:
+            move = next_timed(moves, finished, stats)
 
-    if depth == 0 or next_state is finished:
+    if move is finished:
+        if stats is not None:
+            started = time.perf_counter()
         if depth == 0:
-            value = evaluate_heuristic(player, state)
+            value = board.get_heuristic(player)
+        else:
+            value = board.get_utility(player)
+        if stats is not None:
+            stats.leaf_evaluations += 1
+            stats.evaluation_time += time.perf_counter() - started
+        if key is not None:
+            table.store(key, value, depth, EXACT)
+        return value, CURRENT
+    best_move = None
+    original_alpha, original_beta = alpha, beta
+    searched = 0
+    while move is not finished:
+        if stats is None:
+            board.make_move(*move)
         else:
-            value = evaluate_utility(player, state)
-        return value, state
-    while next_state is not finished:
+            make_timed(board, move, stats)
+        value, _ = search_board(player, board, depth - 1, alpha, beta,
+                                not is_player, table=table, deadline=deadline,
+                                ordering=ordering, stats=stats, ply=ply + 1,
+                                cancel=cancel)
+        if stats is None:
+            board.unmake_move()
+        else:
+            unmake_timed(board, stats)
+        searched += 1
         if is_player:
-            value, _ = minimax(player, next_state, depth - 1, alpha, beta, False)
             if value > alpha:
                 alpha = value
-                best_state = next_state
+                best_move = move
         else:
-            value, _ = minimax(player, next_state, depth - 1, alpha, beta, True)
             if value < beta:
                 beta = value
-                best_state = next_state
+                best_move = move
         if alpha >= beta:
+            if ordering is not None:
+                ordering.add_cutoff(ply, move, depth)
+            if stats is not None:
+                stats.cutoffs += 1
+                if searched == 1:
+                    stats.first_move_cutoffs += 1
             break
-        next_state = next(next_states, finished)
+        if stats is None:
+            move = next(moves, finished)
+        else:
+            move = next_timed(moves, finished, stats)
     if is_player:
-        return alpha, best_state
+        value = alpha
     else:
-        return beta, best_state
+        value = beta
+    if key is not None:
+        table.store(key, value, depth,
+                    get_bound(value, original_alpha, original_beta),
+                    best_move)
+    return value, best_move
+
+
+def search_root(player, state, depth, alpha, beta, table=None,
+                deadline=None, first_move=None, ordering=None, stats=None,
+                cancel=None):
+    """
+    Chama o minimax na raiz (onde joga player). Todas as buscas usadas pelo
+    aprofundamento iterativo tem esta interface
+    """
+    return minimax(player, state, depth, alpha, beta, True, table, deadline,
+                   first_move, ordering, stats, cancel=cancel)
+
+
+def iterative_deepening(player, state, budget, table=None,
+                        max_depth=MAX_DEPTH, ordering=None, stats=None,
+                        search=search_root, aspiration=None, cancel=None):
+    """
+    Busca com profundidade 1, 2, 3... ate que o tempo (em segundos) acabe,
+    retornando o resultado da ultima profundidade completada. A melhor jogada
+    de cada iteracao eh a primeira a ser buscada na seguinte.
+
+    Se aspiration for informado, cada iteracao comeca com uma janela ao redor
+    do valor da anterior, com meia largura aspiration * |valor|; se o
+    resultado cair fora dela, a iteracao eh refeita com a janela inteira.
+
+    Se cancel (um threading.Event) for sinalizado, a busca para como se o
+    tempo tivesse acabado e retorna a melhor jogada encontrada ate entao. Nem
+    o tempo nem cancel interrompem a primeira iteracao, para que haja sempre
+    uma jogada buscada
+    """
+    deadline = time.time() + budget
+    if ordering is not None:
+        ordering.new_search()
+    result = None, None
+    first_move = None
+    for depth in range(1, max_depth + 1):
+        # A primeira iteracao sempre termina, para haver uma jogada
+        iteration_deadline = deadline if depth > 1 else None
+        iteration_cancel = cancel if depth > 1 else None
+        alpha, beta = -inf, inf
+        if aspiration is not None and result[1] is not None:
+            delta = max(abs(result[0]) * aspiration, 1)
+            alpha, beta = result[0] - delta, result[0] + delta
+        try:
+            value, best_state = search(
+                player, state, depth, alpha, beta, table, iteration_deadline,
+                first_move, ordering, stats, cancel=iteration_cancel)
+            if (alpha, beta) != (-inf, inf) and \
+                    (best_state is None or not alpha < value < beta):
+                value, best_state = search(
+                    player, state, depth, -inf, inf, table,
+                    iteration_deadline, first_move, ordering, stats,
+                    cancel=iteration_cancel)
+        except SearchTimeout:
+            break
+        if best_state is None:
+            break
+        result = value, best_state
+        first_move = (best_state.last_move.y, best_state.last_move.x)
+        if time.time() >= deadline:
+            break
+        if cancel is not None and cancel.is_set():
+            break
+    return result
@@ -0,0 +1,191 @@
+# encoding: utf-8
+import collections
+import time
+from .transposition import EXACT, LOWER_BOUND, UPPER_BOUND, get_bound
+from .exceptions import SearchTimeout
+from .minimax import CURRENT, get_ordered_moves, get_result_state, \
+                     search_root, next_timed, make_timed, unmake_timed
+from .searchboard import SearchBoard
+from .stats import SearchStats
+
+inf = float('inf')
+
+
+def _flip_bound(bound, color):
+    """
+    A tabela de transposicao guarda os valores do ponto de vista de player
+    (como o minimax). Do ponto de vista do adversario, os limites se invertem
+    """
+    if color == 1 or bound == EXACT:
+        return bound
+    if bound == LOWER_BOUND:
+        return UPPER_BOUND
+    return LOWER_BOUND
+
+
+def negamax(player, state, depth, alpha, beta, color, table=None,
+            deadline=None, first_move=None, ordering=None, stats=None, ply=0,
+            cancel=None):
+    """
+    Busca negamax com principal variation search: o primeiro filho eh
+    buscado com a janela inteira e os demais com janela nula, sendo buscados
+    de novo apenas quando a superam.
+
+    Os valores sao do ponto de vista de quem joga em state: color eh 1 quando
+    esse jogador eh player e -1 caso contrario. Como o minimax, a arvore eh
+    percorrida num SearchBoard
+    """
+    board = SearchBoard.from_state(state)
+    value, move = negamax_board(player, board, depth, alpha, beta, color,
+                                table, deadline, first_move, ordering, stats,
+                                ply, cancel)
+    return value, get_result_state(state, move)
+
+
+def negamax_board(player, board, depth, alpha, beta, color, table=None,
+                  deadline=None, first_move=None, ordering=None, stats=None,
+                  ply=0, cancel=None):
+    """
+    Negamax sobre um SearchBoard, retornando a jogada como search_board
+    """
+    if deadline is not None and time.time() > deadline:
+        raise SearchTimeout()
+    if cancel is not None and cancel.is_set():
+        raise SearchTimeout()
+    if stats is not None:
+        stats.add_node(ply)
+    finished = object()
+    key = None
+    if table is not None:
+        key = table.get_key(board, player)
+        entry = table.get(key)
+        if entry is not None:
+            entry = entry._replace(value=color * entry.value,
+                                   bound=_flip_bound(entry.bound, color))
+            if entry.is_usable(depth, alpha, beta):
+                if entry.move is None:
+                    return entry.value, CURRENT
+                return entry.value, entry.move
+            if first_move is None:
+                first_move = entry.move
+    if depth == 0:
+        move = finished
+    else:
+        moves = get_ordered_moves(board, first_move, ordering, ply)
+        if stats is None:
+            move = next(moves, finished)
+        else:
+            move = next_timed(moves, finished, stats)
+
+    if move is finished:
+        if stats is not None:
+            started = time.perf_counter()
+        if depth == 0:
+            value = color * board.get_heuristic(player)
+        else:
+            value = color * board.get_utility(player)
+        if stats is not None:
+            stats.leaf_evaluations += 1
+            stats.evaluation_time += time.perf_counter() - started
+        if key is not None:
+            table.store(key, color * value, depth, EXACT)
+        return value, CURRENT
+    best_move = None
+    original_alpha = alpha
+    searched = 0
+    while move is not finished:
+        if stats is None:
+            board.make_move(*move)
+        else:
+            make_timed(board, move, stats)
+        kwargs = dict(table=table, deadline=deadline, ordering=ordering,
+                      stats=stats, ply=ply + 1, cancel=cancel)
+        if searched == 0 or alpha == -inf:
+            value, _ = negamax_board(player, board, depth - 1, -beta, -alpha,
+                                     -color, **kwargs)
+            value = -value
+        else:
+            # Janela nula: so queremos saber se o filho supera alpha
+            value, _ = negamax_board(player, board, depth - 1, -alpha - 1,
+                                     -alpha, -color, **kwargs)
+            value = -value
+            if alpha < value < beta:
+                value, _ = negamax_board(player, board, depth - 1, -beta,
+                                         -value, -color, **kwargs)
+                value = -value
+        if stats is None:
+            board.unmake_move()
+        else:
+            unmake_timed(board, stats)
+        searched += 1
+        if value > alpha:
+            alpha = value
+            best_move = move
+        if alpha >= beta:
+            alpha = beta
+            if ordering is not None:
+                ordering.add_cutoff(ply, move, depth)
+            if stats is not None:
+                stats.cutoffs += 1
+                if searched == 1:
+                    stats.first_move_cutoffs += 1
+            break
+        if stats is None:
+            move = next(moves, finished)
+        else:
+            move = next_timed(moves, finished, stats)
+    if key is not None:
+        bound = get_bound(alpha, original_alpha, beta)
+        table.store(key, color * alpha, depth, _flip_bound(bound, color),
+                    best_move)
+    return alpha, best_move
+
+
+def principal_variation(player, state, depth, alpha, beta, table=None,
+                        deadline=None, first_move=None, ordering=None,
+                        stats=None, cancel=None):
+    """
+    Mesma interface do minimax chamado na raiz (is_player verdadeiro): o
+    valor retornado eh do ponto de vista de player
+    """
+    color = 1 if state.player == player else -1
+    value, best_state = negamax(player, state, depth, alpha, beta, color,
+                                table, deadline, first_move, ordering, stats,
+                                cancel=cancel)
+    return color * value, best_state
+
+
+SearchReport = collections.namedtuple(
+    "SearchReport", ["search", "depth", "value", "move", "nodes", "time"])
+
+
+def compare_searches(state, depth):
+    """
+    Executa o minimax e o PVS na mesma profundidade, sem tabela de
+    transposicao, e retorna os nos visitados e o tempo de cada um
+    """
+    reports = []
+    for name, search in (("minimax", search_root),
+                         ("pvs", principal_variation)):
+        stats = SearchStats()
+        started = time.time()
+        value, best_state = search(state.player, state, depth, -inf, inf,
+                                   stats=stats)
+        reports.append(SearchReport(
+            search=name,
+            depth=depth,
+            value=value,
+            move=(best_state.last_move.y, best_state.last_move.x),
+            nodes=stats.nodes,
+            time=time.time() - started
+        ))
+    return reports
+
+
+if __name__ == "__main__":
+    import sys
+    from .state import State
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    state = State.from_moves([(7, 7), (7, 6), (6, 6), (5, 5), (7, 5), (5, 7)])
+    for report in compare_searches(state, depth):
+        print(report)
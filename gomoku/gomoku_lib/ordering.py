@@ -0,0 +1,58 @@
+# encoding: utf-8
+
+# Numero de jogadas killer guardadas por nivel da arvore
+KILLER_SLOTS = 2
+
+
+class MoveOrdering(object):
+    """
+    Guarda as jogadas que causaram cortes na poda alfa-beta, para que sejam
+    buscadas primeiro nos proximos nos:
+
+    - killers: ate KILLER_SLOTS jogadas por nivel (ply) que causaram cortes
+      em nos irmaos
+    - history: pontuacao de cada casa, somada a cada corte causado por ela
+    """
+    __slots__ = ["killers", "history"]
+
+    def __init__(self):
+        self.killers = {}
+        self.history = {}
+
+    def get_killers(self, ply):
+        return self.killers.get(ply, ())
+
+    def add_cutoff(self, ply, move, depth):
+        """
+        Registra que a jogada move causou um corte no nivel ply, numa busca
+        com a profundidade restante depth
+        """
+        killers = self.get_killers(ply)
+        if move not in killers:
+            self.killers[ply] = ((move, ) + killers)[:KILLER_SLOTS]
+        self.history[move] = self.history.get(move, 0) + depth * depth
+
+    def sort(self, moves, ply):
+        """
+        Ordena as jogadas: primeiro as killers do nivel, depois pela
+        pontuacao do history. Empates mantem a ordem original
+        """
+        killers = self.get_killers(ply)
+        history = self.history
+
+        def key(move):
+            if move in killers:
+                return 0, killers.index(move), 0
+            return 1, 0, -history.get(move, 0)
+        return sorted(moves, key=key)
+
+    def new_search(self):
+        """
+        Prepara para a busca de uma nova jogada: os killers sao relativos a
+        raiz antiga e sao descartados, e o history perde metade do peso
+        """
+        self.killers = {}
+        self.history = {
+            move: score // 2
+            for move, score in self.history.items() if score > 1
+        }
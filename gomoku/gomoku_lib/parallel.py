@@ -0,0 +1,129 @@
+# encoding: utf-8
+import collections
+import concurrent.futures
+import multiprocessing
+import time
+from .minimax import minimax
+from .state import State
+from .transposition import TranspositionTable
+from .ordering import MoveOrdering
+
+inf = float('inf')
+# Folga abaixo do melhor valor ja encontrado usada como alfa de cada filho
+# (veja _search_child). Qualquer valor positivo serve: ela so muda quanto
+# da arvore eh cortado
+TIE_MARGIN = 1
+
+# Estado global de cada processo do pool, criado por _init_worker
+_worker = {}
+
+
+def _init_worker(shared_alpha):
+    _worker["alpha"] = shared_alpha
+    _worker["table"] = TranspositionTable()
+    _worker["ordering"] = MoveOrdering()
+
+
+def _get_shared_alpha():
+    shared_alpha = _worker["alpha"]
+    with shared_alpha.get_lock():
+        return shared_alpha.value
+
+
+def _raise_shared_alpha(value):
+    shared_alpha = _worker["alpha"]
+    with shared_alpha.get_lock():
+        if value > shared_alpha.value:
+            shared_alpha.value = value
+
+
+def _search_child(player, moves, geometry, move, depth):
+    """
+    Busca, num processo do pool, o filho da raiz obtido jogando move. Os
+    estados nao sao enviados entre processos: a raiz eh reconstruida a
+    partir das jogadas e da geometria
+    """
+    state = State.from_moves(moves, geometry).mark(*move)
+    # O melhor valor ja encontrado por outro processo serve de alfa, com uma
+    # folga: com alfa-beta fail-hard, um valor <= alfa eh apenas um limite
+    # superior, e sem a folga um filho que empata com o melhor nao teria
+    # valor exato. Assim, qualquer que seja a ordem em que os processos
+    # terminem, os filhos sem valor exato sao piores que o melhor
+    alpha = _get_shared_alpha() - TIE_MARGIN
+    value, _ = minimax(player, state, depth - 1, alpha, inf, False,
+                       table=_worker["table"], ordering=_worker["ordering"])
+    exact = value > alpha
+    if exact:
+        _raise_shared_alpha(value)
+    return value, exact
+
+
+def parallel_minimax(player, state, depth, workers=None):
+    """
+    Busca a melhor jogada distribuindo os filhos da raiz entre processos.
+    O resultado eh escolhido de forma deterministica: o maior valor exato,
+    desempatando pela ordem de State.get_next_moves
+    """
+    root_moves = list(state.get_next_moves())
+    if depth < 2 or len(root_moves) < 2:
+        return minimax(player, state, depth, -inf, inf, True)
+    moves = state.get_moves()
+    shared_alpha = multiprocessing.Value("d", -inf)
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(shared_alpha, )) as executor:
+        futures = [
+            executor.submit(_search_child, player, moves, state.geometry,
+                            move, depth)
+            for move in root_moves
+        ]
+        results = [future.result() for future in futures]
+    # O alfa compartilhado nunca passa do melhor valor, entao o melhor filho
+    # sempre tem valor exato. Nos empates vale a ordem das jogadas, como no
+    # minimax serial
+    best = None
+    for number, (value, exact) in enumerate(results):
+        if exact and (best is None or value > results[best][0]):
+            best = number
+    return results[best][0], state.mark(*root_moves[best])
+
+
+ParallelReport = collections.namedtuple(
+    "ParallelReport",
+    ["depth", "workers", "serial_time", "parallel_time", "speedup",
+     "serial_value", "parallel_value"]
+)
+
+
+def compare_with_serial(state, depth, workers=None):
+    """
+    Executa a busca serial e a paralela com a mesma profundidade e retorna
+    os tempos e o speedup. As duas usam tabela de transposicao e ordenacao
+    de jogadas, como cada processo do pool
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    started = time.time()
+    serial_value, _ = minimax(state.player, state, depth, -inf, inf, True,
+                              table=TranspositionTable(),
+                              ordering=MoveOrdering())
+    serial_time = time.time() - started
+    started = time.time()
+    parallel_value, _ = parallel_minimax(state.player, state, depth, workers)
+    parallel_time = time.time() - started
+    return ParallelReport(
+        depth=depth,
+        workers=workers,
+        serial_time=serial_time,
+        parallel_time=parallel_time,
+        speedup=serial_time / parallel_time,
+        serial_value=serial_value,
+        parallel_value=parallel_value
+    )
+
+
+if __name__ == "__main__":
+    import sys
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    state = State.from_moves([(7, 7), (7, 6), (6, 6), (5, 5), (7, 5), (5, 7)])
+    print(compare_with_serial(state, depth))
@@ -0,0 +1,260 @@
+# encoding: utf-8
+import collections
+import mmap
+import os
+import struct
+from .constants import X_PLAYER, O_PLAYER
+from .geometry import Geometry, DEFAULT_GEOMETRY
+from .state import State
+from .exceptions import InvalidRecord, InvalidGeometry
+
+# Formato do arquivo: cabecalho (MAGIC, versao) seguido das partidas, uma
+# apos a outra. Nao ha um indice nem o numero de partidas, entao novas
+# partidas podem ser acrescentadas ao final do arquivo
+MAGIC = b"GMKR"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+# Cada partida: largura, altura, pecas para vencer, vencedor (WINNER_CODES)
+# e numero de jogadas, seguido do historico (como State.history: uma casa
+# por jogada, com geometry.cell_bytes bytes, ou seja, um byte no 15x15)
+RECORD = struct.Struct("<HHBBI")
+WINNER_CODES = {None: 0, X_PLAYER: 1, O_PLAYER: 2}
+WINNERS = {code: winner for winner, code in WINNER_CODES.items()}
+
+BaseGameRecord = collections.namedtuple(
+    "BaseGameRecord", ["geometry", "winner", "history"])
+
+
+class GameRecord(BaseGameRecord):
+    """
+    Uma partida gravada: a geometria, o vencedor (ou None) e o historico de
+    jogadas. Os estados so sao criados quando pedidos (get_state e
+    get_states)
+    """
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state.geometry, state.windows.winner, state.history)
+
+    @classmethod
+    def from_moves(cls, moves, winner=None, geometry=DEFAULT_GEOMETRY):
+        history = b"".join(geometry.encode_cell(geometry.cell_index(y, x))
+                           for y, x in moves)
+        return cls(geometry, winner, history)
+
+    def __len__(self):
+        return len(self.history) // self.geometry.cell_bytes
+
+    def get_moves(self):
+        """
+        Retorna as jogadas (y, x) da partida, em ordem
+        """
+        geometry = self.geometry
+        return [geometry.get_position(cell)
+                for cell in geometry.decode_history(self.history)]
+
+    def get_state(self, ply=None):
+        """
+        Retorna o estado depois das primeiras ply jogadas (todas por padrao)
+        """
+        history = self.history
+        if ply is not None:
+            history = history[:ply * self.geometry.cell_bytes]
+        return State.from_history(history, self.geometry)
+
+    def get_states(self):
+        """
+        Gera os estados da partida, do inicial ate o final, um de cada vez
+        """
+        state = State.get_initial_state(self.geometry)
+        yield state
+        for y, x in self.get_moves():
+            state = state.mark(y, x)
+            yield state
+
+    def pack(self):
+        geometry = self.geometry
+        return RECORD.pack(geometry.width, geometry.height, geometry.winning,
+                           WINNER_CODES[self.winner], len(self)) + \
+            self.history
+
+
+def _unpack_record(header):
+    """
+    Retorna a geometria, o vencedor e o tamanho do historico de um cabecalho
+    de partida, ou (None, None, 0) se ele for invalido
+    """
+    width, height, winning, winner, length = header
+    if winner not in WINNERS:
+        return None, None, 0
+    try:
+        geometry = Geometry(width, height, winning)
+    except InvalidGeometry:
+        return None, None, 0
+    return geometry, WINNERS[winner], length * geometry.cell_bytes
+
+
+def _is_valid_history(geometry, history):
+    """
+    Retorna verdadeiro se todas as casas do historico estao no tabuleiro e
+    nenhuma delas aparece mais de uma vez
+    """
+    cells = list(geometry.decode_history(history))
+    return all(cell < geometry.size for cell in cells) and \
+        len(set(cells)) == len(cells)
+
+
+class RecordWriter(object):
+    """
+    Grava partidas em um arquivo binario aberto (output), uma de cada vez.
+    O cabecalho eh escrito apenas se o arquivo estiver vazio, entao o
+    escritor pode continuar um arquivo aberto para acrescentar ("ab")
+    """
+    __slots__ = ["output", "count"]
+
+    def __init__(self, output):
+        self.output = output
+        self.count = 0
+        if output.tell() == 0:
+            output.write(HEADER.pack(MAGIC, VERSION))
+
+    def write(self, record):
+        self.output.write(record.pack())
+        self.count += 1
+
+    def write_state(self, state):
+        """
+        Grava a partida que levou a state
+        """
+        self.write(GameRecord.from_state(state))
+
+    def flush(self):
+        self.output.flush()
+
+    def close(self):
+        self.output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_writer(path):
+    """
+    Abre o arquivo em path para acrescentar partidas, criando-o se ele nao
+    existe
+    """
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as existing:
+            if not _is_valid_header(existing.read(HEADER.size)):
+                raise InvalidRecord(path)
+    return RecordWriter(open(path, "ab"))
+
+
+def _is_valid_header(data):
+    if len(data) < HEADER.size:
+        return False
+    magic, version = HEADER.unpack_from(data, 0)
+    return magic == MAGIC and version == VERSION
+
+
+def read_records(stream):
+    """
+    Gera as partidas de um arquivo binario aberto, lendo uma de cada vez
+    """
+    path = getattr(stream, "name", stream)
+    if not _is_valid_header(stream.read(HEADER.size)):
+        raise InvalidRecord(path)
+    while True:
+        data = stream.read(RECORD.size)
+        if not data:
+            return
+        if len(data) < RECORD.size:
+            raise InvalidRecord(path)
+        geometry, winner, size = _unpack_record(RECORD.unpack(data))
+        history = stream.read(size)
+        if geometry is None or len(history) < size or \
+                not _is_valid_history(geometry, history):
+            raise InvalidRecord(path)
+        yield GameRecord(geometry, winner, history)
+
+
+class RecordFile(object):
+    """
+    Arquivo de partidas somente leitura. O arquivo eh mapeado em memoria e
+    as partidas sao lidas durante a iteracao, sem carrega-lo inteiro
+    """
+    __slots__ = ["path", "file", "map"]
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except ValueError:
+            # Arquivos vazios nao podem ser mapeados
+            self.file.close()
+            raise InvalidRecord(path)
+        if not _is_valid_header(self.map[:HEADER.size]):
+            self.close()
+            raise InvalidRecord(path)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        data = self.map
+        offset = HEADER.size
+        while offset < len(data):
+            if offset + RECORD.size > len(data):
+                raise InvalidRecord(self.path)
+            geometry, winner, size = _unpack_record(
+                RECORD.unpack_from(data, offset))
+            offset += RECORD.size
+            if geometry is None or offset + size > len(data):
+                raise InvalidRecord(self.path)
+            history = data[offset:offset + size]
+            if not _is_valid_history(geometry, history):
+                raise InvalidRecord(self.path)
+            yield GameRecord(geometry, winner, history)
+            offset += size
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(
+        description="Resume ou cria arquivos de partidas gravadas")
+    parser.add_argument("path", help="arquivo de partidas")
+    parser.add_argument(
+        "--from-jsonl", nargs="*", default=[],
+        help="arquivos JSONL de partidas ({\"moves\": ..., \"winner\": ...}) "
+             "acrescentados ao arquivo, no tabuleiro padrao")
+    args = parser.parse_args()
+    if args.from_jsonl:
+        with open_writer(args.path) as writer:
+            for jsonl in args.from_jsonl:
+                with open(jsonl) as games:
+                    for line in games:
+                        game = json.loads(line)
+                        writer.write(GameRecord.from_moves(
+                            game["moves"], game.get("winner")))
+        print("%d games written to %s" % (writer.count, args.path))
+    games = moves = 0
+    wins = {}
+    with RecordFile(args.path) as records:
+        for record in records:
+            games += 1
+            moves += len(record)
+            wins[record.winner] = wins.get(record.winner, 0) + 1
+    print("%d games, %d moves, %s" % (games, moves, wins))
@@ -0,0 +1,464 @@
+# encoding: utf-8
+import collections
+import functools
+from .constants import X_PLAYER, O_PLAYER
+from .geometry import DEFAULT_GEOMETRY
+from .sequence import AXES
+from .zobrist import get_keys
+from .heuristic import evaluate_sides, combine_scores
+from .utility import get_utility
+
+# Codigo de cada jogador nas casas do tabuleiro (0 eh uma casa livre)
+PLAYER_CODES = {X_PLAYER: 1, O_PLAYER: 2}
+
+BoardTables = collections.namedtuple(
+    "BoardTables", ["lines", "zobrist_keys", "reach"])
+
+
+def _get_lines(geometry):
+    """
+    Pre-calcula, para cada eixo de Sequence e cada casa, a linha inteira do
+    tabuleiro que passa pela casa (na ordem do eixo, como as jogadas de uma
+    Sequence) e a posicao da casa nela
+    """
+    lines = []
+    for first, last in AXES:
+        cell_lines = [None] * geometry.size
+        for y in range(geometry.height):
+            for x in range(geometry.width):
+                if geometry.is_valid_position(*first(y, x, 1)):
+                    continue
+                # (y, x) eh o inicio de uma linha
+                line = []
+                ly, lx = y, x
+                while geometry.is_valid_position(ly, lx):
+                    line.append(geometry.cell_index(ly, lx))
+                    ly, lx = last(ly, lx, 1)
+                line = tuple(line)
+                for position, cell in enumerate(line):
+                    cell_lines[cell] = (line, position)
+        lines.append(tuple(cell_lines))
+    return tuple(lines)
+
+
+@functools.lru_cache(maxsize=None)
+def get_board_tables(geometry):
+    """
+    Pre-calcula as tabelas do SearchBoard para a geometria:
+
+    - lines: as linhas de cada casa (veja _get_lines)
+    - zobrist_keys: as chaves de zobrist.get_keys, pelo codigo do jogador
+    - reach: alcance, para cada lado, das casas que mudam o valor de uma
+      sequencia (veja Sequence.touches)
+    """
+    keys = get_keys(geometry)
+    return BoardTables(
+        lines=_get_lines(geometry),
+        zobrist_keys=(None, keys[X_PLAYER], keys[O_PLAYER]),
+        reach=geometry.winning - 1
+    )
+
+
+class SearchBoard(object):
+    """
+    Tabuleiro mutavel usado dentro da busca. make_move e unmake_move alteram
+    as estruturas no lugar, entao um no da arvore nao cria um State, um
+    Sequences e um Bitboard novos como State.mark.
+
+    As sequencias de State sao as sequencias maximas de pecas de um jogador
+    em cada eixo, e aqui nao sao guardadas: sao lidas das casas quando
+    necessario. Apenas a ordem em que Sequences as guardaria eh mantida
+    (stamps), para que get_next_moves gere as jogadas na mesma ordem que
+    State.get_next_moves, e os valores da heuristica e da utilidade sao os
+    mesmos de heuristic.evaluate e utility.evaluate, calculados com as mesmas
+    funcoes (heuristic.evaluate_sides, heuristic.combine_scores e
+    utility.get_utility).
+
+    cells e stamps sao dicionarios com apenas as casas usadas, entao criar
+    o tabuleiro nao custa a area da geometria
+    """
+    __slots__ = ["cells", "player", "move_count", "zobrist", "scores",
+                 "winner", "stamps", "counter", "stones", "history",
+                 "geometry", "tables"]
+
+    def __init__(self, geometry=DEFAULT_GEOMETRY):
+        self.geometry = geometry
+        self.tables = get_board_tables(geometry)
+        # Casa -> codigo do jogador, apenas para as casas marcadas
+        self.cells = {}
+        self.player = PLAYER_CODES[O_PLAYER]
+        self.move_count = 0
+        self.zobrist = 0
+        # Soma de evaluate_sequence das sequencias de cada jogador
+        self.scores = [0, 0, 0]
+        self.winner = 0
+        # Para cada eixo, a ordem de insercao da sequencia que comeca em
+        # cada casa
+        self.stamps = tuple({} for _ in AXES)
+        self.counter = 0
+        self.stones = []
+        # O que unmake_move precisa para desfazer cada jogada
+        self.history = []
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Cria o tabuleiro repetindo as jogadas de state. Repetir as jogadas
+        (em vez de copiar o Sequences) reproduz a ordem de insercao das
+        sequencias
+        """
+        board = cls(state.geometry)
+        for y, x in state.get_moves():
+            board.make_move(y, x)
+        return board
+
+    def finished(self):
+        return bool(self.winner) or \
+            self.move_count == self.geometry.size
+
+    def is_valid_position(self, y, x):
+        return self.geometry.is_valid_position(y, x)
+
+    def is_marked(self, y, x):
+        return self.is_valid_position(y, x) and \
+            self.geometry.cell_index(y, x) in self.cells
+
+    def get_run(self, axis, cell):
+        """
+        Retorna a linha, a posicao da primeira casa nela e o tamanho da
+        sequencia que passa pela casa (marcada) no eixo
+        """
+        cells = self.cells
+        line, position = self.tables.lines[axis][cell]
+        player = cells[cell]
+        start = position
+        while start > 0 and cells.get(line[start - 1], 0) == player:
+            start -= 1
+        end = position
+        while end + 1 < len(line) and \
+                cells.get(line[end + 1], 0) == player:
+            end += 1
+        return line, start, end - start + 1
+
+    def scan(self, line, low, high, player):
+        """
+        Retorna se ha pecas do adversario e do jogador nas posicoes low a
+        high (inclusive) da linha
+        """
+        cells = self.cells
+        opponent = own = False
+        for position in range(low, high + 1):
+            value = cells.get(line[position], 0)
+            if value == player:
+                own = True
+            elif value:
+                opponent = True
+        return opponent, own
+
+    def count_sides(self, line, start, length, player, n=None):
+        """
+        Retorna os valores de Sequence.count_blocked e
+        Sequence.count_near_merge da sequencia
+        """
+        if n is None:
+            n = self.geometry.winning - length
+        if n <= 0:
+            return 0, 0
+        blocked = near_merge = 0
+        top = start + length - 1
+        sides = ((top + 1, top + n), (start - n, start - 1))
+        for low, high in sides:
+            if low < 0 or high >= len(line):
+                # A borda esta a menos de n passos
+                blocked += 1
+                continue
+            opponent, own = self.scan(line, low, high, player)
+            if opponent:
+                blocked += 1
+            elif own:
+                near_merge += 1
+        return blocked, near_merge
+
+    def evaluate_run(self, line, start, length, player):
+        """
+        Mesmo valor de heuristic.evaluate_sequence
+        """
+        blocked, near_merge = self.count_sides(line, start, length, player)
+        return evaluate_sides(length, blocked, near_merge)
+
+    def add_touching(self, cell, sign):
+        """
+        Soma (sign 1) ou subtrai (sign -1) das somas de cada jogador o valor
+        das sequencias que tocam a casa (veja Sequence.touches)
+        """
+        cells = self.cells
+        scores = self.scores
+        lines = self.tables.lines
+        reach = self.tables.reach
+        winning = self.geometry.winning
+        for axis in range(len(AXES)):
+            line, position = lines[axis][cell]
+            low = max(position - reach, 0)
+            high = min(position + reach, len(line) - 1)
+            current = low
+            while current <= high:
+                player = cells.get(line[current], 0)
+                if not player:
+                    current += 1
+                    continue
+                start = current
+                while start > 0 and \
+                        cells.get(line[start - 1], 0) == player:
+                    start -= 1
+                end = current
+                while end + 1 < len(line) and \
+                        cells.get(line[end + 1], 0) == player:
+                    end += 1
+                length = end - start + 1
+                run_reach = max(winning - length, 1)
+                offset = position - start
+                if -run_reach <= offset < length + run_reach:
+                    scores[player] += sign * self.evaluate_run(
+                        line, start, length, player)
+                current = end + 1
+
+    def make_move(self, y, x):
+        """
+        Marca a casa para quem joga, como State.mark
+        """
+        cell = self.geometry.cell_index(y, x)
+        player = self.player
+        cells = self.cells
+        stamps = self.stamps
+        restore = []
+        self.history.append((cell, self.scores[1], self.scores[2],
+                             self.winner, self.counter, restore))
+        self.add_touching(cell, -1)
+        cells[cell] = player
+        # As sequencias que mudam sao inseridas na ordem de Sequences.append:
+        # primeiro as estendidas (na ordem em que foram inseridas antes),
+        # depois as novas, de uma casa, e por fim as unidas
+        extended = []
+        created = []
+        merged = []
+        for axis in range(len(AXES)):
+            line, position = self.tables.lines[axis][cell]
+            line, start, length = self.get_run(axis, cell)
+            if length >= self.geometry.winning and not self.winner:
+                self.winner = player
+            top = start + length - 1
+            left = start < position
+            right = top > position
+            if left:
+                first = stamps[axis][line[start]]
+            if right:
+                last = stamps[axis][line[position + 1]]
+            if left and right:
+                merged.append((min(first, last), axis, line[start]))
+            elif left:
+                extended.append((first, axis, line[start]))
+            elif right:
+                extended.append((last, axis, cell))
+            else:
+                created.append((0, axis, cell))
+        extended.sort()
+        merged.sort()
+        for changed in (extended, created, merged):
+            for _, axis, start in changed:
+                if start != cell:
+                    # A sequencia que comecava aqui volta a existir quando a
+                    # jogada for desfeita
+                    restore.append((axis, start, stamps[axis][start]))
+                stamps[axis][start] = self.counter
+                self.counter += 1
+        self.add_touching(cell, 1)
+        self.zobrist ^= self.tables.zobrist_keys[player][cell]
+        self.move_count += 1
+        self.player = 3 - player
+        self.stones.append(cell)
+
+    def unmake_move(self):
+        """
+        Desfaz a ultima jogada feita com make_move
+        """
+        cell, x_score, o_score, winner, counter, restore = self.history.pop()
+        self.stones.pop()
+        self.player = 3 - self.player
+        self.move_count -= 1
+        self.zobrist ^= self.tables.zobrist_keys[self.player][cell]
+        del self.cells[cell]
+        for axis, start, stamp in restore:
+            self.stamps[axis][start] = stamp
+        self.scores[1] = x_score
+        self.scores[2] = o_score
+        self.winner = winner
+        self.counter = counter
+
+    def get_last_move(self):
+        """
+        Retorna a casa (y, x) da ultima jogada, ou None
+        """
+        if not self.stones:
+            return None
+        return self.geometry.get_position(self.stones[-1])
+
+    def get_runs(self, cells=None):
+        """
+        Retorna as sequencias (tamanho, ordem de insercao, eixo, primeira
+        casa, jogador) das casas informadas (todas por padrao), na ordem de
+        Sequences: por tamanho e, nos empates, pela ordem de insercao
+        """
+        board = self.cells
+        stamps = self.stamps
+        lines = self.tables.lines
+        runs = []
+        for cell in self.stones if cells is None else cells:
+            player = board[cell]
+            for axis in range(len(AXES)):
+                line, position = lines[axis][cell]
+                if cells is None and position > 0 and \
+                        board.get(line[position - 1], 0) == player:
+                    # A casa nao eh o inicio da sequencia
+                    continue
+                line, start, length = self.get_run(axis, cell)
+                runs.append((length, stamps[axis][line[start]], axis,
+                             line[start], player))
+        runs.sort()
+        return runs
+
+    def count_run_sides(self, run, n=None):
+        length, _, axis, first, player = run
+        line, start = self.tables.lines[axis][first]
+        return self.count_sides(line, start, length, player, n)
+
+    def get_next_moves(self):
+        """
+        Gera as casas (y, x) candidatas para a proxima jogada, na mesma ordem
+        de State.get_next_moves
+        """
+        if self.finished():
+            return
+        geometry = self.geometry
+        lines = self.tables.lines
+        cells = self.cells
+        moves = []
+        seen = set()
+        c = 100
+        if self.stones:
+            runs = self.get_runs()
+            sequences = runs
+            n = 10
+            jump = None
+            sequences_found = []
+            while True:
+                if jump is None:
+                    sequences = sequences[-n:]
+                else:
+                    sequences = sequences[-n - jump:-n]
+                if jump is not None and not sequences:
+                    break
+                sequences = [run for run in sequences
+                             if self.count_run_sides(run)[0] < 2]
+                if sequences:
+                    sequences_found.extend(sequences)
+                    if len(sequences_found) > 10:
+                        break
+                else:
+                    if jump is None:
+                        jump = n
+                    else:
+                        jump += n
+                    sequences = runs
+            sequences = list(sequences_found)
+            sequences.sort(key=lambda run: (
+                run[0], run[4] != self.player,
+                -self.count_run_sides(run)[0], self.count_run_sides(run)[1]
+            ), reverse=True)
+            last = self.get_runs(self.stones[-1:])
+            sequences.extend(run for run in last
+                             if self.count_run_sides(run)[0] < 2 and
+                             run not in sequences)
+            sequences.extend([run for run in runs
+                              if self.count_run_sides(run, 1)[0] < 2][:10])
+            for length, _, axis, first, _ in sequences:
+                line, start = lines[axis][first]
+                for position in (start - 1, start + length):
+                    if position < 0 or position >= len(line):
+                        continue
+                    cell = line[position]
+                    if cell not in seen and cell not in cells and c > 0:
+                        yield geometry.get_position(cell)
+                        moves.append(cell)
+                        seen.add(cell)
+                        c -= 1
+
+        center = geometry.cell_index(*geometry.get_center())
+        if center not in cells and c > 0 and center not in seen:
+            yield geometry.get_position(center)
+            moves.append(center)
+            seen.add(center)
+            c -= 1
+        while moves and c > 0:
+            y, x = geometry.get_position(moves.pop())
+            for v in (-1, 1):
+                for h in (-1, 1):
+                    yn, xn = y + v, x + h
+                    if not geometry.is_valid_position(yn, xn):
+                        continue
+                    cell = geometry.cell_index(yn, xn)
+                    if cell in cells or cell in seen:
+                        continue
+                    seen.add(cell)
+                    yield yn, xn
+
+    def get_heuristic(self, player):
+        """
+        Mesmo valor de heuristic.evaluate
+        """
+        player = PLAYER_CODES[player]
+        return combine_scores(self.scores[player], self.scores[3 - player],
+                              self.move_count)
+
+    def get_utility(self, player):
+        """
+        Mesmo valor de utility.evaluate
+        """
+        player = PLAYER_CODES[player]
+        counts = [0, 0, 0]
+        for run in self.get_runs():
+            counts[run[4]] += 1
+        return get_utility(counts[player], counts[3 - player],
+                           self.move_count, self.winner == player)
+
+
+def measure_allocations(state):
+    """
+    Mede com o tracemalloc a memoria alocada para cada filho de state: com
+    State.mark (o novo estado e suas estruturas) e com make_move (o que fica
+    guardado no SearchBoard ate o unmake_move). Retorna a media em bytes de
+    cada um
+    """
+    import tracemalloc
+    moves = list(state.get_next_moves())
+    board = SearchBoard.from_state(state)
+    marked = made = 0
+    tracemalloc.start()
+    for move in moves:
+        before = tracemalloc.get_traced_memory()[0]
+        child = state.mark(*move)
+        marked += tracemalloc.get_traced_memory()[0] - before
+        del child
+        before = tracemalloc.get_traced_memory()[0]
+        board.make_move(*move)
+        made += tracemalloc.get_traced_memory()[0] - before
+        board.unmake_move()
+    tracemalloc.stop()
+    return marked / float(len(moves)), made / float(len(moves))
+
+
+if __name__ == "__main__":
+    from .state import State
+    state = State.from_moves([(7, 7), (7, 6), (6, 6), (5, 5), (7, 5), (5, 7)])
+    marked, made = measure_allocations(state)
+    print("State.mark: %.0f bytes per child" % marked)
+    print("SearchBoard.make_move: %.0f bytes per child" % made)
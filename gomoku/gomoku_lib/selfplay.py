@@ -0,0 +1,168 @@
+# encoding: utf-8
+import collections
+import concurrent.futures
+import json
+import random
+import time
+from .state import State
+from .geometry import Geometry, DEFAULT_GEOMETRY
+from .minimax import minimax, iterative_deepening
+from .transposition import TranspositionTable
+from .ordering import MoveOrdering
+from .stats import SearchStats
+from .record import GameRecord, open_writer
+from .exceptions import InvalidGeometry
+
+inf = float('inf')
+
+# Parametros padrao das partidas
+SELFPLAY_DEPTH = 2
+OPENING_PLIES = 2
+# Numero de jogadas candidatas (na ordem de State.get_next_moves) entre as
+# quais as jogadas da abertura sao sorteadas
+OPENING_CHOICES = 8
+
+SelfPlayReport = collections.namedtuple(
+    "SelfPlayReport", ["games", "time", "games_per_second", "wins"])
+
+
+def choose_move(state, depth=None, budget=None, table=None, ordering=None,
+                stats=None):
+    """
+    Escolhe a jogada da IA com profundidade fixa (depth) ou com tempo
+    limitado (budget, em segundos, com aprofundamento iterativo)
+    """
+    if budget is not None:
+        value, best_state = iterative_deepening(
+            state.player, state, budget, table, ordering=ordering,
+            stats=stats)
+    else:
+        value, best_state = minimax(state.player, state, depth, -inf, inf,
+                                    True, table=table, ordering=ordering,
+                                    stats=stats)
+    move = best_state.last_move
+    return move.y, move.x
+
+
+def play_game(number, seed, depth=SELFPLAY_DEPTH, budget=None,
+              opening=OPENING_PLIES, with_stats=False,
+              geometry=DEFAULT_GEOMETRY):
+    """
+    Joga uma partida da IA contra ela mesma. As opening primeiras jogadas
+    sao sorteadas (com a semente seed + number) para que as partidas sejam
+    diferentes. Retorna um dicionario que pode ser escrito em JSON, com as
+    estatisticas (SearchStats.as_dict) de cada busca se with_stats for
+    verdadeiro. A partida eh jogada num tabuleiro com a geometria informada
+    """
+    rng = random.Random(seed + number)
+    state = State.get_initial_state(geometry)
+    table = TranspositionTable()
+    ordering = MoveOrdering()
+    move_times = []
+    move_stats = []
+    started = time.time()
+    while not state.finished():
+        move_started = time.time()
+        if state.move_count < opening:
+            candidates = list(state.get_next_moves())[:OPENING_CHOICES]
+            move = rng.choice(candidates)
+        else:
+            if budget is not None:
+                ordering.new_search()
+            stats = SearchStats() if with_stats else None
+            move = choose_move(state, depth, budget, table, ordering, stats)
+            if stats is not None:
+                move_stats.append(stats.as_dict())
+        state = state.mark(*move)
+        move_times.append(time.time() - move_started)
+    result = {
+        "game": number,
+        "seed": seed + number,
+        "winner": state.windows.winner,
+        "length": state.move_count,
+        "moves": state.get_moves(),
+        "move_times": move_times,
+        "time": time.time() - started
+    }
+    if with_stats:
+        result["stats"] = move_stats
+    return result
+
+
+def run_selfplay(output, games, depth=SELFPLAY_DEPTH, budget=None,
+                 opening=OPENING_PLIES, workers=None, seed=0,
+                 with_stats=False, geometry=DEFAULT_GEOMETRY, records=None):
+    """
+    Joga games partidas num pool de processos, escrevendo cada resultado
+    como uma linha JSON em output (um arquivo aberto) assim que a partida
+    termina. Se records (um record.RecordWriter) for informado, as partidas
+    tambem sao gravadas nele
+    """
+    wins = {}
+    started = time.time()
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers) as executor:
+        futures = [
+            executor.submit(play_game, number, seed, depth, budget, opening,
+                            with_stats, geometry)
+            for number in range(games)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            if records is not None:
+                records.write(GameRecord.from_moves(
+                    result["moves"], result["winner"], geometry))
+                records.flush()
+            wins[result["winner"]] = wins.get(result["winner"], 0) + 1
+    elapsed = time.time() - started
+    return SelfPlayReport(
+        games=games,
+        time=elapsed,
+        games_per_second=games / elapsed,
+        wins=wins
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Partidas da IA contra ela mesma, sem interface")
+    parser.add_argument("output", help="arquivo JSONL com os resultados")
+    parser.add_argument("--games", type=int, default=10)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--depth", type=int, default=SELFPLAY_DEPTH,
+                       help="profundidade fixa de cada busca")
+    group.add_argument("--time", type=float, default=None,
+                       help="tempo (segundos) de cada jogada")
+    parser.add_argument("--opening", type=int, default=OPENING_PLIES,
+                        help="jogadas sorteadas no inicio de cada partida")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stats", action="store_true",
+                        help="inclui as estatisticas de cada busca")
+    parser.add_argument("--width", type=int, default=DEFAULT_GEOMETRY.width)
+    parser.add_argument("--height", type=int,
+                        default=DEFAULT_GEOMETRY.height)
+    parser.add_argument("--winning", type=int,
+                        default=DEFAULT_GEOMETRY.winning,
+                        help="pecas em sequencia para vencer")
+    parser.add_argument("--records", default=None,
+                        help="arquivo binario onde as partidas sao "
+                             "acrescentadas (veja record.py)")
+    args = parser.parse_args()
+    try:
+        geometry = Geometry(args.width, args.height, args.winning)
+    except InvalidGeometry as e:
+        parser.error(str(e))
+    records = open_writer(args.records) if args.records else None
+    try:
+        with open(args.output, "w") as output:
+            report = run_selfplay(output, args.games, args.depth, args.time,
+                                  args.opening, args.workers, args.seed,
+                                  args.stats, geometry, records)
+    finally:
+        if records is not None:
+            records.close()
+    print(report)
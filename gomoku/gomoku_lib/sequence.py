@@ -1,17 +1,40 @@
 # encoding: utf-8
 import collections
-from .constants import ALL_DIRECTIONS, WINNING_CONDITION
+from .constants import ALL_DIRECTIONS
+from .cache import COUNT_BLOCKED, COUNT_NEAR_MERGE
+
+# Vetor (dy, dx) de cada direcao
+VECTORS = {direction: tuple(direction(0, 0, 1)) for direction in ALL_DIRECTIONS}
+# Pares de direcoes opostas (os eixos) e o numero de cada um
+AXES = tuple(zip(ALL_DIRECTIONS[::2], ALL_DIRECTIONS[1::2]))
+AXIS_NUMBERS = {axis: number for number, axis in enumerate(AXES)}
+
 BaseSequence = collections.namedtuple("BaseSequence", ["moves", "directions"])
 
 
 class Sequence(BaseSequence):
+    def get_key(self):
+        """
+        Identidade canonica da sequencia: (jogador, eixo, casa inicial,
+        tamanho). Como as jogadas sao sempre guardadas na ordem do eixo, a
+        casa inicial eh a primeira jogada
+        """
+        if not self.moves:
+            return ()
+        first = self.moves[0]
+        return (first.player, AXIS_NUMBERS[self.directions], first.y, first.x,
+                len(self.moves))
+
     def __eq__(self, other):
         if not isinstance(other, Sequence):
             raise TypeError("Cannot compare Sequence with %s" % type(other))
-        if self.directions != other.directions:
-            return False
-        return all(move in other.moves for move in self.moves) or \
-            all(move in self.moves for move in other.moves)
+        return self.get_key() == other.get_key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.get_key())
 
     def __len__(self):
         return len(self.moves)
@@ -74,63 +97,40 @@ class Sequence(BaseSequence):
 
     def is_top_blocked(self, state, n=None):
         if n is None:
-            n = WINNING_CONDITION-len(self)
+            n = state.geometry.winning-len(self)
         top = self.moves[-1]
-        top_move = self.directions[-1]
-        player = self.player
-        for _ in range(n):
-            top = top.apply_direction(top_move)
-            if not state.is_valid_position(top.y, top.x):
-                return True
-            if state.is_marked(top.y, top.x) and not \
-                    state.is_marked_by(top.y, top.x, player):
-                return True
-        return False
+        return state.is_line_blocked(top.y, top.x, self.directions[-1], n,
+                                     self.player)
 
     def is_top_near_merge(self, state, n=None):
         if n is None:
-            n = WINNING_CONDITION-len(self)
+            n = state.geometry.winning-len(self)
         if self.is_top_blocked(state, n):
             return False
         top = self.moves[-1]
-        top_move = self.directions[-1]
-        player = self.player
-        sequences = state.get_sequences()
-        sequences = sequences.get_by_player(self.player)
-        for _ in range(n):
-            top = top.apply_direction(top_move)
-            seq = sequences.get_by_position(top.y, top.x)
-            seq = any(s.directions == self.directions for s in seq)
-            if seq:
-                return True
-        return False
+        return state.has_line_piece(top.y, top.x, self.directions[-1], n,
+                                    self.player)
 
     def is_bottom_near_merge(self, state, n=None):
         if n is None:
-            n = WINNING_CONDITION-len(self)
+            n = state.geometry.winning-len(self)
         if self.is_bottom_blocked(state, n):
             return False
         bottom = self.moves[0]
-        bottom_move = self.directions[0]
-        player = self.player
-        sequences = state.get_sequences()
-        sequences = sequences.get_by_player(self.player)
-        for _ in range(n):
-            bottom = bottom.apply_direction(bottom_move)
-            seq = sequences.get_by_position(bottom.y, bottom.x)
-            seq = any(s.directions == self.directions for s in seq)
-            if seq:
-                return True
-        return False
+        return state.has_line_piece(bottom.y, bottom.x, self.directions[0], n,
+                                    self.player)
 
     def count_near_merge(self, state, n=None):
         if n is None:
-            n = WINNING_CONDITION-len(self)
-        result = 0
-        if self.is_top_near_merge(state, n):
-            result += 1
-        if self.is_bottom_near_merge(state, n):
-            result += 1
+            n = state.geometry.winning-len(self)
+        result = state.cache.get(COUNT_NEAR_MERGE, self, n)
+        if result is None:
+            result = 0
+            if self.is_top_near_merge(state, n):
+                result += 1
+            if self.is_bottom_near_merge(state, n):
+                result += 1
+            state.cache.set(COUNT_NEAR_MERGE, self, n, result)
         return result
 
     def is_near_merge(self, state, n=None):
@@ -138,18 +138,10 @@ class Sequence(BaseSequence):
 
     def is_bottom_blocked(self, state, n=None):
         if n is None:
-            n = WINNING_CONDITION-len(self)
+            n = state.geometry.winning-len(self)
         bottom = self.moves[0]
-        bottom_move = self.directions[0]
-        player = self.player
-        for _ in range(n):
-            bottom = bottom.apply_direction(bottom_move)
-            if not state.is_valid_position(bottom.y, bottom.x):
-                return True
-            if state.is_marked(bottom.y, bottom.x) and not \
-                    state.is_marked_by(bottom.y, bottom.x, player):
-                return True
-        return False
+        return state.is_line_blocked(bottom.y, bottom.x, self.directions[0],
+                                     n, self.player)
 
     def is_blocked(self, state, n=None):
         """
@@ -160,14 +152,37 @@ class Sequence(BaseSequence):
 
     def count_blocked(self, state, n=None):
         if n is None:
-            n = WINNING_CONDITION-len(self)
-        result = 0
-        if self.is_top_blocked(state, n):
-            result += 1
-        if self.is_bottom_blocked(state, n):
-            result += 1
+            n = state.geometry.winning-len(self)
+        result = state.cache.get(COUNT_BLOCKED, self, n)
+        if result is None:
+            result = 0
+            if self.is_top_blocked(state, n):
+                result += 1
+            if self.is_bottom_blocked(state, n):
+                result += 1
+            state.cache.set(COUNT_BLOCKED, self, n, result)
         return result
 
+    def touches(self, y, x, winning):
+        """
+        Retorna se a casa (y, x) esta na sequencia, em uma de suas pontas ou
+        entre as casas usadas para saber se ela esta bloqueada ou perto de
+        um merge, com winning pecas em sequencia para vencer
+        """
+        first = self.moves[0]
+        dy, dx = VECTORS[self.directions[-1]]
+        oy, ox = y - first.y, x - first.x
+        if dy:
+            k = oy * dy
+            if ox != k * dx:
+                return False
+        else:
+            if oy:
+                return False
+            k = ox * dx
+        reach = max(winning - len(self), 1)
+        return -reach <= k < len(self) + reach
+
     def append(self, move):
         if move.player != self.player or move in self.moves:
             return self
@@ -183,7 +198,7 @@ class Sequence(BaseSequence):
 
     @classmethod
     def get_for_move(cls, move):
-        for directions in zip(ALL_DIRECTIONS[::2], ALL_DIRECTIONS[1::2]):
+        for directions in AXES:
             yield cls((move, ), directions)
 
     @classmethod
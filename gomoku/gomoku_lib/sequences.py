@@ -1,33 +1,161 @@
 # encoding: utf-8
 import collections
-import copy
-import bisect
-from .constants import BOARD_WIDTH, BOARD_HEIGHT
-from .sequence import Sequence
-from .utilities import is_valid_position
+import functools
+import itertools
+import threading
+from .constants import X_PLAYER, O_PLAYER
+from .sequence import Sequence, AXES
+from .cellmap import CellMap, CellMapChanges
+
+def index_add(index, sequence, geometry):
+    """
+    Adiciona a sequencia as casas por onde ela passa no indice
+    """
+    for move in sequence:
+        cell = geometry.cell_index(move.y, move.x)
+        index[cell] = index.get(cell, ()) + (sequence, )
+
+
+def index_remove(index, sequence, geometry):
+    """
+    Remove a sequencia das casas por onde ela passa no indice
+    """
+    for move in sequence:
+        cell = geometry.cell_index(move.y, move.x)
+        index[cell] = tuple(seq for seq in index[cell] if seq is not sequence)
+
+
+# Numero de casas cujas vizinhas ficam guardadas (veja get_near_cells)
+NEAR_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=NEAR_CACHE_SIZE)
+def get_near_cells(geometry, cell):
+    """
+    Calcula, na primeira vez que a casa eh consultada, as casas alinhadas a
+    ela a menos de geometry.winning passos, junto com a direcao (o par de
+    directions de Sequence) do alinhamento
+    """
+    y, x = geometry.get_position(cell)
+    cells = []
+    for axis in AXES:
+        for direction in axis:
+            for n in range(1, geometry.winning):
+                ny, nx = direction(y, x, n)
+                if not geometry.is_valid_position(ny, nx):
+                    break
+                cells.append((geometry.cell_index(ny, nx), axis))
+    return tuple(cells)
+
+
+class SequencesLog(object):
+    """
+    Ordem das sequencias de um Sequences que permite append: por tamanho e,
+    entre as do mesmo tamanho, pela ordem em que foram adicionadas.
+
+    Cada append cria um log com apenas as operacoes que fez (ops: pares
+    (adicionada, sequencia), em ordem) sobre o log anterior (parent), sem
+    copiar as sequencias. A tupla ordenada so eh montada quando pedida
+    (get_sequences), repetindo as operacoes a partir do ancestral mais
+    proximo que ja a tem; depois disso parent e ops sao liberados
+    """
+    __slots__ = ["parent", "ops", "size", "sequences"]
+
+    # Os estados (e seus logs) podem ser usados ao mesmo tempo pela
+    # interface e pela busca em outra thread
+    lock = threading.Lock()
+
+    def __init__(self, parent=None, ops=(), size=0):
+        self.parent = parent
+        self.ops = ops
+        self.size = size
+        self.sequences = () if parent is None else None
+
+    def get_sequences(self):
+        sequences = self.sequences
+        if sequences is None:
+            with self.lock:
+                sequences = self.build()
+        return sequences
+
+    def build(self):
+        if self.sequences is not None:
+            return self.sequences
+        logs = []
+        log = self
+        while log.sequences is None:
+            logs.append(log)
+            log = log.parent
+        buckets = {}
+        for sequence in log.sequences:
+            buckets.setdefault(len(sequence), {})[sequence] = None
+        for log in reversed(logs):
+            for added, sequence in log.ops:
+                if added:
+                    buckets.setdefault(len(sequence), {})[sequence] = None
+                else:
+                    del buckets[len(sequence)][sequence]
+        self.sequences = tuple(itertools.chain.from_iterable(
+            buckets[length] for length in sorted(buckets)
+        ))
+        self.parent = None
+        self.ops = None
+        return self.sequences
+
 
 BaseSequences = collections.namedtuple(
     "BaseSequences",
-    ["sequences", "board", "can_append"]
+    ["sequences", "board", "can_append", "index", "players", "members",
+     "log", "geometry"]
 )
 
 
 class Sequences(BaseSequences):
+    """
+    Conjunto ordenado (por tamanho) de sequencias.
+
+    - sequences: a tupla ordenada das sequencias, nos objetos filtrados (que
+      nao permitem append). Nos outros eh None: a tupla eh montada pelo log
+      apenas quando o conjunto eh percorrido (veja get_ordered)
+    - board: para cada casa (cell_index), as sequencias que tem uma ponta
+      nela, num CellMap
+    - index: para cada jogador, um CellMap casa -> sequencias que passam
+      por ela
+    - players: jogadores cujas sequencias fazem parte deste conjunto
+    - members: quando o conjunto eh um filtro que nao depende apenas do
+      jogador, as sequencias que fazem parte dele
+    - log: a ordem das sequencias, como um SequencesLog (apenas nos objetos
+      que permitem append)
+    """
+
     @classmethod
-    def get_initial_sequences(cls):
+    def get_initial_sequences(cls, geometry):
         return cls(
-            sequences=tuple(),
-            board=tuple(
-               tuple(tuple() for _ in range(BOARD_WIDTH))
-               for _ in range(BOARD_HEIGHT)
-            ),
-            can_append=True
+            sequences=None,
+            board=CellMap.get_empty(geometry),
+            can_append=True,
+            index={X_PLAYER: CellMap.get_empty(geometry),
+                   O_PLAYER: CellMap.get_empty(geometry)},
+            players=(X_PLAYER, O_PLAYER),
+            members=None,
+            log=SequencesLog(),
+            geometry=geometry
         )
 
+    def get_ordered(self):
+        """
+        Retorna a tupla das sequencias, ordenada por tamanho
+        """
+        if self.sequences is None:
+            return self.log.get_sequences()
+        return self.sequences
+
     def __iter__(self):
-        return iter(self.sequences)
+        return iter(self.get_ordered())
 
     def __len__(self):
+        if self.sequences is None:
+            return self.log.size
         return len(self.sequences)
 
     def get_by_position(self, py, px):
@@ -35,32 +163,67 @@ class Sequences(BaseSequences):
         Retorna um iterator que contem apenas as sequencias presentes em um
         determinado ponto
         """
-        sequences = (
-            seq
-            for seq in self
-            if any(move.y == py and move.x == px for move in seq)
-        )
+        cell = self.geometry.cell_index(py, px)
+        sequences = ()
+        for player in self.players:
+            sequences += self.index[player].get(cell, ())
+        if self.members is not None:
+            sequences = tuple(
+                seq for seq in sequences if seq in self.members
+            )
+        # Mantem a ordem por tamanho do conjunto original
+        return self.filter(sorted(sequences, key=len))
+
+    def get_by_touching(self, py, px):
+        """
+        Retorna as sequencias que tocam um determinado ponto (veja
+        Sequence.touches), usando o indice apenas nas casas alinhadas a ele
+        """
+        geometry = self.geometry
+        cell = geometry.cell_index(py, px)
+        found = {}
+        for player in self.players:
+            for seq in self.index[player].get(cell, ()):
+                found[seq] = None
+        for cell, axis in get_near_cells(geometry, cell):
+            for player in self.players:
+                for seq in self.index[player].get(cell, ()):
+                    if seq.directions == axis and seq not in found and \
+                            seq.touches(py, px, geometry.winning):
+                        found[seq] = None
+        sequences = found
+        if self.members is not None:
+            sequences = (seq for seq in sequences if seq in self.members)
+        return self.filter(sorted(sequences, key=len))
+
+    def filter(self, sequences):
+        """
+        Retorna um novo objeto, que nao permite append, contendo apenas as
+        sequencias informadas (que devem pertencer a este objeto)
+        """
+        sequences = tuple(sequences)
         return Sequences(
-            sequences=tuple(sequences), 
-            board=None, 
-            can_append=False
+            sequences=sequences,
+            board=self.board,
+            can_append=False,
+            index=self.index,
+            players=self.players,
+            members=frozenset(sequences),
+            log=None,
+            geometry=self.geometry
         )
-    
+
     def get_largest_sequences(self, n, jump=None):
         """
         Retorna as N maiores sequencias, desconsiderando as ultimas JUMP 
         sequencias
         """
-        sequences = self.sequences
+        sequences = self.get_ordered()
         if jump is None:
             sequences = sequences[-n:]
         else:
             sequences = sequences[-n-jump:-n]
-        return Sequences(
-            sequences=sequences, 
-            board=None, 
-            can_append=False
-        )
+        return self.filter(sequences)
     
 
     def get_smallest_sequences(self, n, jump=None):
@@ -68,16 +231,12 @@ class Sequences(BaseSequences):
         Retorna as N menores sequencias, desconsiderando as primeiras JUMP
         sequencias
         """
-        sequences = self.sequences
+        sequences = self.get_ordered()
         if jump is None:
             sequences = sequences[:n]
         else:
             sequences = sequences[jump:jump+n]
-        return  Sequences(
-            sequences=sequences, 
-            board=None,
-            can_append=False
-        )
+        return self.filter(sequences)
     
 
     def get_by_near_merge(self, state, sides, n=None):
@@ -88,11 +247,7 @@ class Sequences(BaseSequences):
         sequences = (
             seq for seq in self if seq.count_near_merge(state, n) == sides
         )
-        return Sequences(
-            sequences=tuple(sequences), 
-            board=None,
-            can_append=False
-        )
+        return self.filter(sequences)
 
     def get_by_sides_blocked(self, state, sides, n=None):
         """
@@ -102,11 +257,7 @@ class Sequences(BaseSequences):
         sequences = (
             seq for seq in self if seq.count_blocked(state, n) == sides
         )
-        return Sequences(
-            sequences=tuple(sequences),
-            board=None,
-            can_append=False
-        )
+        return self.filter(sequences)
     
     def get_by_not_blocked(self, state, n=None):
         """
@@ -116,23 +267,27 @@ class Sequences(BaseSequences):
         sequences = (
             seq for seq in self if seq.count_blocked(state, n) < 2
         )
-        return Sequences(
-            sequences=tuple(sequences),
-            board=None,
-            can_append=False
-        )
+        return self.filter(sequences)
 
     def get_by_player(self, player):
         """
         Retorna um iterator que contem apenas as sequencias de um determinado
         jogador
         """
-        sequences = (sequence for sequence in self
-                     if sequence.player in player)
+        sequences = tuple(sequence for sequence in self
+                          if sequence.player in player)
+        members = self.members
+        if members is not None:
+            members = frozenset(sequences)
         return Sequences(
-            sequences=tuple(sequences),
-            board=None,
-            can_append=False
+            sequences=sequences,
+            board=self.board,
+            can_append=False,
+            index=self.index,
+            players=tuple(p for p in self.players if p in player),
+            members=members,
+            log=None,
+            geometry=self.geometry
         )
 
     def get_by_length(self, length):
@@ -141,19 +296,14 @@ class Sequences(BaseSequences):
         especificado
         """
         sequences = (sequence for sequence in self if len(sequence) == length)
-        return Sequences(
-            sequences=tuple(sequences),
-            board=None,
-            can_append=False
-        )
+        return self.filter(sequences)
 
     def append(self, state, move):
         if not self.can_append:
             raise TypeError("Cannot append to a filtered Sequences object")
-        sequences = list(self.sequences)
-        # board = copy.copy(self.board)
-        board = list(self.board)
-        local_sequences = list(board[move.y][move.x])
+        changes = SequencesChanges(self, move.player)
+        local_sequences = self.board.get(
+            self.geometry.cell_index(move.y, move.x), ())
         new_local_sequences = []
         # Consider adding the move to the sequences in the point already listed
         for sequence in local_sequences:
@@ -166,81 +316,17 @@ class Sequences(BaseSequences):
                 "{} should modify {} when added to it, but it didn't".format(
                     move, sequence
                 )
-            sequence_move = sequence.bottom_end()
-            if sequence_move != move:
-                sequence_move = sequence.top_end()
-            assert sequence_move == move, \
-                ("{} does not match {}, " +
-                 "so {} should not be in the {} position").format(
-                    sequence_move, move, sequence_move, move
-                )
-            assert sequence in sequences, "{} is not in sequences list".format(
-                sequence
-            )
-            # Remove the old sequence from the sequences list..
-            sequences.remove(sequence)
-            # Remove the old sequence from all the old positions
-            for end in sequence.ends():
-                if not state.is_valid_position(end.y, end.x):
-                    continue
-                y, x = end.y, end.x
-                board[y] = list(board[y])
-                board[y][x] = list(board[y][x])
-                board[y][x].remove(sequence)
-                board[y][x] = tuple(board[y][x])
-                board[y] = tuple(board[y])
-            # for seqmov in sequence:
-            #     y, x = seqmov.y, seqmov.x
-            #     assert sequence in board[y][x]
-            #     board[y] = list(board[y])
-            #     board[y][x] = list(board[y][x])
-            #     board[y][x].remove(sequence)
-            #     board[y][x] = tuple(board[y][x])
-            #     board[y] = tuple(board[y])
-            # Add the new sequence to the new lists..
-            bisect.insort(sequences, seq)
+            # Replace the old sequence by the new one..
+            changes.remove(sequence)
+            changes.add(seq)
             new_local_sequences.append(seq)
-            # Add the new sequence to the new positions..
-            for end in seq.ends():
-                if not state.is_valid_position(end.y, end.x):
-                    continue
-                y, x = end.y, end.x
-                board[y] = list(board[y])
-                board[y][x] = list(board[y][x])
-                board[y][x].append(seq)
-                board[y][x] = tuple(board[y][x])
-                board[y] = tuple(board[y])
-            # for seqmov in seq:
-            #     y, x = seqmov.y, seqmov.x
-            #     assert seq not in board[y][x]
-            #     board[y] = list(board[y])
-            #     board[y][x] = list(board[y][x])
-            #     board[y][x].append(seq)
-            #     board[y][x] = tuple(board[y][x])
-            #     board[y] = tuple(board[y])
         # Locate new "sequences" related to that move that can be considered..
+        directions = set(seq.directions for seq in new_local_sequences)
         for sequence in Sequence.get_for_move(move):
-            if sequence in new_local_sequences:
+            if sequence.directions in directions:
                 continue
-            bisect.insort(sequences, sequence)
+            changes.add(sequence)
             new_local_sequences.append(sequence)
-            for end in sequence.ends():
-                if not state.is_valid_position(end.y, end.x):
-                    continue
-                y, x = end.y, end.x
-                board[y] = list(board[y])
-                board[y][x] = list(board[y][x])
-                board[y][x].append(sequence)
-                board[y][x] = tuple(board[y][x])
-                board[y] = tuple(board[y])
-            # for seqmov in sequence:
-            #     y, x = seqmov.y, seqmov.x
-            #     assert sequence not in board[y][x]
-            #     board[y] = list(board[y])
-            #     board[y][x] = list(board[y][x])
-            #     board[y][x].append(sequence)
-            #     board[y][x] = tuple(board[y][x])
-            #     board[y] = tuple(board[y])
         # Here, we filter possible sequences that can be merged with the move..
         seq_groups = {}
         for seq in new_local_sequences:
@@ -256,35 +342,8 @@ class Sequences(BaseSequences):
             seq = None
             while seq_group:
                 seq = seq_group.pop()
-                # Remove the old sequence that will be added to the merge from
-                # the sequences list
-                assert seq in sequences, \
-                    ("{} should be in sequences list.." +
-                     "but it does not exist in that list").format(seq)
-                sequences.remove(seq)
-                # Remove the endings of the old sequence that will be merged
-                for end in seq.ends():
-                    if not state.is_valid_position(end.y, end.x):
-                        continue
-                    y, x = end.y, end.x
-                    board[y] = list(board[y])
-                    board[y][x] = list(board[y][x])
-                    assert seq in board[y][x], \
-                        ("{} should have end in {} but it does not " +
-                         "exist in it").format(
-                            seq, end
-                        )
-                    board[y][x].remove(seq)
-                    board[y][x] = tuple(board[y][x])
-                    board[y] = tuple(board[y])
-                # for seqmov in seq:
-                #     y, x = seqmov.y, seqmov.x
-                #     assert seq in board[y][x]
-                #     board[y] = list(board[y])
-                #     board[y][x] = list(board[y][x])
-                #     board[y][x].remove(seq)
-                #     board[y][x] = tuple(board[y][x])
-                #     board[y] = tuple(board[y])
+                # Remove the old sequence that will be added to the merge
+                changes.remove(seq)
                 if merged is None:
                     merged = seq
                     continue
@@ -295,29 +354,77 @@ class Sequences(BaseSequences):
                      "caused it to..").format(merged, seq))
                 merged = new_merged
             if merged is not None:
-                # Add the merged sequence to the sequences list...
-                bisect.insort(sequences, merged)
-                # ... and add it's endings to the positions..
-                for end in merged.ends():
-                    if not state.is_valid_position(end.y, end.x):
-                        continue
-                    y, x = end.y, end.x
-                    board[y] = list(board[y])
-                    board[y][x] = list(board[y][x])
-                    board[y][x].append(merged)
-                    board[y][x] = tuple(board[y][x])
-                    board[y] = tuple(board[y])
-                # for seqmov in merged:
-                #     y, x = seqmov.y, seqmov.x
-                #     assert merged not in board[y][x]
-                #     board[y] = list(board[y])
-                #     board[y][x] = list(board[y][x])
-                #     board[y][x].append(merged)
-                #     board[y][x] = tuple(board[y][x])
-                #     board[y] = tuple(board[y])
+                changes.add(merged)
         # Return the new Sequences object..
+        return changes.get_sequences()
+
+
+class SequencesChanges(object):
+    """
+    Acumula as sequencias removidas e adicionadas por Sequences.append. O
+    board e o indice do jogador sao CellMap, entao apenas as casas que mudam
+    sao copiadas (CellMapChanges), e a ordem das sequencias nao eh copiada:
+    as operacoes formam o log do novo objeto. O custo depende apenas das
+    sequencias que a jogada altera
+    """
+    __slots__ = ["log", "ops", "size", "board", "indexes", "index",
+                 "player", "players", "geometry"]
+
+    def __init__(self, sequences, player):
+        self.log = sequences.log
+        self.ops = []
+        self.size = sequences.log.size
+        self.board = CellMapChanges(sequences.board)
+        # Apenas as sequencias do jogador da jogada mudam, entao so o indice
+        # dele eh alterado
+        self.indexes = dict(sequences.index)
+        self.player = player
+        self.index = CellMapChanges(self.indexes[player])
+        self.players = sequences.players
+        self.geometry = sequences.geometry
+
+    def add(self, sequence):
+        self.ops.append((True, sequence))
+        self.size += 1
+        index_add(self.index, sequence, self.geometry)
+        # Add the sequence to the positions of its endings..
+        for end in sequence.ends():
+            if not self.geometry.is_valid_position(end.y, end.x):
+                continue
+            cell = self.geometry.cell_index(end.y, end.x)
+            self.board[cell] = self.board.get(cell, ()) + (sequence, )
+
+    def remove(self, sequence):
+        first = sequence.moves[0]
+        assert sequence in self.index.get(
+            self.geometry.cell_index(first.y, first.x), ()), \
+            "{} is not in sequences list".format(sequence)
+        self.ops.append((False, sequence))
+        self.size -= 1
+        index_remove(self.index, sequence, self.geometry)
+        # Remove the sequence from the positions of its endings..
+        for end in sequence.ends():
+            if not self.geometry.is_valid_position(end.y, end.x):
+                continue
+            cell = self.geometry.cell_index(end.y, end.x)
+            assert sequence in self.board.get(cell, ()), \
+                ("{} should have end in {} but it does not " +
+                 "exist in it").format(sequence, end)
+            local = tuple(seq for seq in self.board[cell] if seq != sequence)
+            if local:
+                self.board[cell] = local
+            else:
+                del self.board[cell]
+
+    def get_sequences(self):
+        self.indexes[self.player] = self.index.get_map()
         return Sequences(
-            sequences=tuple(sequences), 
-            board=tuple(board),
-            can_append=True
+            sequences=None,
+            board=self.board.get_map(),
+            can_append=True,
+            index=self.indexes,
+            players=self.players,
+            members=None,
+            log=SequencesLog(self.log, tuple(self.ops), self.size),
+            geometry=self.geometry
         )
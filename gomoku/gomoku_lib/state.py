@@ -4,15 +4,23 @@ import copy
 import time
 from .sequences import Sequences
 from .sequence import Sequence
-from .constants import BOARD_WIDTH, BOARD_HEIGHT, WINNING_CONDITION, EMPTY, \
-                        X_PLAYER, O_PLAYER
+from .bitboard import Bitboard
+from .zobrist import get_keys
+from .heuristic import Scores
+from .cache import SequenceCache
+from .windows import Windows
+from .constants import EMPTY, X_PLAYER, O_PLAYER
+from .geometry import DEFAULT_GEOMETRY
 from .move import Move
 from .exceptions import AlreadyMarked, InvalidLocation
-from .utilities import is_valid_position
 
+# history guarda o indice da casa (cell_index) de cada jogada, em bytes
+# (geometry.cell_bytes por jogada): os estados anteriores nao sao mantidos
+# vivos e podem ser reconstruidos por ele. geometry eh a Geometry da partida
 BaseState = collections.namedtuple(
-    "BaseState", ["board", "player", "move_count", "message", "parent",
-                  "last_move", "sequences", "started_at"])
+    "BaseState", ["board", "player", "move_count", "message", "history",
+                  "last_move", "sequences", "started_at", "zobrist",
+                  "scores", "cache", "windows", "geometry"])
 
 
 class State(BaseState):
@@ -21,17 +29,64 @@ class State(BaseState):
     """
 
     @classmethod
-    def get_initial_state(cls):
-        return cls(board=tuple(
-            tuple(EMPTY for _ in range(BOARD_WIDTH))
-            for _ in range(BOARD_HEIGHT)),
+    def get_initial_state(cls, geometry=DEFAULT_GEOMETRY):
+        return cls(board=Bitboard.get_empty(geometry),
                    player=O_PLAYER,
                    started_at=time.time(),
                    move_count=0,
                    message=None,
-                   parent=None,
+                   history=b"",
                    last_move=None,
-                   sequences=Sequences.get_initial_sequences())
+                   sequences=Sequences.get_initial_sequences(geometry),
+                   zobrist=0,
+                   scores=Scores(values={X_PLAYER: 0, O_PLAYER: 0}),
+                   cache=SequenceCache(),
+                   windows=Windows.get_initial_windows(geometry),
+                   geometry=geometry)
+
+    @classmethod
+    def from_moves(cls, moves, geometry=DEFAULT_GEOMETRY):
+        """
+        Reconstroi o estado jogando, a partir do estado inicial, as jogadas
+        (y, x) informadas
+        """
+        state = cls.get_initial_state(geometry)
+        for y, x in moves:
+            state = state.mark(y, x)
+        return state
+
+    @classmethod
+    def from_history(cls, history, geometry=DEFAULT_GEOMETRY):
+        """
+        Reconstroi o estado a partir de um historico (bytes com o indice da
+        casa de cada jogada, como em State.history)
+        """
+        return cls.from_moves(
+            (geometry.get_position(cell)
+             for cell in geometry.decode_history(history)), geometry)
+
+    def get_moves(self):
+        """
+        Retorna as jogadas (y, x) feitas desde o estado inicial, em ordem
+        """
+        geometry = self.geometry
+        return [geometry.get_position(cell)
+                for cell in geometry.decode_history(self.history)]
+
+    def rewind(self, ply):
+        """
+        Retorna o estado depois das primeiras ply jogadas desta partida. Os
+        estados anteriores nao sao guardados: ele eh reconstruido a partir do
+        historico, mantendo o inicio da partida e a mensagem atual
+        """
+        if not 0 <= ply <= self.move_count:
+            raise ValueError("Invalid ply: {}".format(ply))
+        if ply == self.move_count:
+            return self
+        state = self.from_history(
+            self.history[:ply * self.geometry.cell_bytes], self.geometry)
+        return state._replace(started_at=self.started_at,
+                              message=self.message)
 
     def get_next_player(self):
         if self.player is X_PLAYER:
@@ -44,39 +99,42 @@ class State(BaseState):
         Retorna se o jogo ja terminou
         """
         return self.check_won() or \
-            self.move_count == BOARD_WIDTH * BOARD_HEIGHT
+            self.move_count == self.geometry.size
 
     def is_valid_position(self, y, x):
-        return is_valid_position(y, x)
+        return self.geometry.is_valid_position(y, x)
 
     def is_marked(self, y, x):
-        return self.is_valid_position(y, x) and self.board[y][x] is not EMPTY
+        return self.is_valid_position(y, x) and self.board.is_marked(y, x)
 
     def is_marked_by(self, y, x, player):
         return self.is_valid_position(
-            y, x) and player in (X_PLAYER, O_PLAYER) and self.board[y][x] == player
+            y, x) and self.board.is_marked_by(y, x, player)
+
+    def is_line_blocked(self, y, x, direction, n, player):
+        """
+        Checa se ha a borda do tabuleiro ou uma peca adversaria em ate n
+        passos na direcao, partindo de (y, x)
+        """
+        return self.board.is_line_blocked(y, x, direction, n, player)
+
+    def has_line_piece(self, y, x, direction, n, player):
+        """
+        Checa se ha uma peca do jogador em ate n passos na direcao, partindo
+        de (y, x)
+        """
+        return self.board.has_line_piece(y, x, direction, n, player)
 
     def display(self, message):
-        return State(
-            board=self.board,
-            started_at=self.started_at,
-            move_count=self.move_count,
-            player=self.player,
-            message=message,
-            parent=self,
-            last_move=self.last_move,
-            sequences=self.sequences)
+        return self._replace(message=message)
 
     def mark(self, y, x):
         if self.is_marked(y, x):
             raise AlreadyMarked(y, x)
-        if not is_valid_position(y, x):
+        if not self.is_valid_position(y, x):
             raise InvalidLocation(y, x)
-        board = list(self.board)
-        board[y] = list(board[y])
-        board[y][x] = self.player
-        board[y] = tuple(board[y])
-        board = tuple(board)
+        cell = self.geometry.cell_index(y, x)
+        board = self.board.mark(y, x, self.player)
         player = self.get_next_player()
         move = Move(y, x, self.player)
         return State(
@@ -85,19 +143,23 @@ class State(BaseState):
             move_count=self.move_count + 1,
             player=player,
             message=self.message,
-            parent=self,
+            history=self.history + self.geometry.encode_cell(cell),
             last_move=move,
-            sequences=self.sequences.append(self, move))
+            sequences=self.sequences.append(self, move),
+            zobrist=self.zobrist ^ get_keys(self.geometry)[self.player][cell],
+            scores=self.scores.get_child(self),
+            cache=SequenceCache(),
+            windows=self.windows.mark(y, x, self.player, board),
+            geometry=self.geometry)
 
     def max_sequence(self, py, px, player=None):
         """
         Dado um ponto, checa a maior sequencia possivel que eh possivel
         alcancar partindo deste ponto
         """
-        sequences = self.sequences
+        sequences = self.sequences.get_by_position(py, px)
         if player is not None:
             sequences = sequences.get_by_player(player)
-        sequences = sequences.get_by_position(py, px)
         if not sequences:
             return Sequence.get_empty()
         return max(sequences, key=len)
@@ -108,7 +170,7 @@ class State(BaseState):
         tabuleiro
         """
         seq = self.max_sequence(py, px, player)
-        return len(seq) >= WINNING_CONDITION
+        return len(seq) >= self.geometry.winning
 
     def count_sequences(self, length, player=None):
         """
@@ -123,12 +185,50 @@ class State(BaseState):
     def get_sequences(self):
         return self.sequences
 
+    def get_scores(self):
+        """
+        Retorna a soma de heuristic.evaluate_sequence das sequencias de cada
+        jogador (veja heuristic.Scores)
+        """
+        return self.scores.get(self)
+
     def check_won(self, player=None):
         """
         Checa se ha uma sequencia vencedora partindo de cada ponto do tabuleiro
         """
-        seq = self.check_max_sequence(player)
-        return len(seq) >= WINNING_CONDITION
+        winner = self.windows.winner
+        if winner is None:
+            return False
+        return player is None or winner in player
+
+    def count_threats(self, player, threat):
+        """
+        Conta as janelas que formam uma ameaca (veja windows.Windows) para o
+        jogador
+        """
+        return self.windows.count(player, threat)
+
+    def get_forced_move(self):
+        """
+        Retorna a jogada (y, x) obrigatoria para quem joga: completar um
+        quatro proprio (vitoria) ou, se nao houver, bloquear um quatro do
+        adversario. Retorna None se nenhuma das duas existe.
+
+        As janelas com quatro pecas sao mantidas por Windows.mark apenas
+        atraves das casas de cada jogada, entao a consulta nao percorre o
+        tabuleiro
+        """
+        if self.finished():
+            return None
+        wins = self.windows.get_winning_cells(self.player)
+        if wins:
+            return min(wins)
+        blocks = self.windows.get_winning_cells(self.get_next_player())
+        if blocks:
+            # Com mais de um bloqueio a partida esta perdida, mas bloquear
+            # ainda eh a melhor jogada
+            return min(blocks)
+        return None
 
     def check_max_sequence(self, player=None):
         """
@@ -141,10 +241,16 @@ class State(BaseState):
             return Sequence.get_empty()
         return max(sequences, key=len)
 
-    def get_next_states(self):
+    def get_next_moves(self):
+        """
+        Gera as casas (y, x) candidatas para a proxima jogada, em ordem de
+        prioridade
+        """
         if self.finished():
             return
         moves = []
+        # Casas ja geradas, para nao repetir jogadas
+        seen = set()
         c = 100
         if len(self.sequences):
             sequences = self.sequences
@@ -174,19 +280,21 @@ class State(BaseState):
             sequences.extend(self.sequences.get_by_not_blocked(self, 1).sequences[:10])
             for sequence in sequences:
                 for move in sequence.ends():
-                     if (move.y, move.x) not in moves and self.is_valid_position(move.y, move.x) and not self.is_marked(move.y, move.x) and c > 0:
-                         yield self.mark(move.y, move.x)
+                     if (move.y, move.x) not in seen and self.is_valid_position(move.y, move.x) and not self.is_marked(move.y, move.x) and c > 0:
+                         yield move.y, move.x
                          moves.append((move.y, move.x))
+                         seen.add((move.y, move.x))
                          c -= 1
 
-        CENTER_Y, CENTER_X = int(BOARD_HEIGHT/2), int(BOARD_WIDTH/2)
+        CENTER_Y, CENTER_X = self.geometry.get_center()
         if self.is_valid_position(CENTER_Y, CENTER_X)  and \
-            not self.is_marked(CENTER_Y, CENTER_X) and c > 0:
-            yield self.mark(CENTER_Y, CENTER_X)
+            not self.is_marked(CENTER_Y, CENTER_X) and c > 0 and \
+            (CENTER_Y, CENTER_X) not in seen:
+            yield CENTER_Y, CENTER_X
             moves.append((CENTER_Y, CENTER_X))
+            seen.add((CENTER_Y, CENTER_X))
             c -= 1
         d = [-1, 1]
-        visited = []
         while moves and c > 0:
             move = moves.pop()
             for v in d:
@@ -201,7 +309,21 @@ class State(BaseState):
                     xn = int(move[1]+h)
                     if not self.is_valid_position(yn, xn)  or \
                         self.is_marked(yn, xn) or \
-                        (yn, xn) in visited:
+                        (yn, xn) in seen:
                         continue
-                    visited.append((yn, xn))
-                    yield self.mark(yn, xn)
+                    seen.add((yn, xn))
+                    yield yn, xn
+
+    def get_next_states(self, ordering=None, ply=0):
+        """
+        Gera os proximos estados. Se um MoveOrdering for informado, as jogadas
+        sao reordenadas pelos killers do nivel ply e pelo history.
+
+        A busca usa as jogadas de get_next_moves diretamente e so cria o
+        estado dos filhos que visita (veja minimax.get_ordered_moves)
+        """
+        moves = self.get_next_moves()
+        if ordering is not None:
+            moves = ordering.sort(moves, ply)
+        for y, x in moves:
+            yield self.mark(y, x)
@@ -0,0 +1,98 @@
+# encoding: utf-8
+
+
+class SearchStats(object):
+    """
+    Contadores preenchidos pela busca quando um objeto deste tipo eh passado
+    para ela. Sem ele (stats=None), a busca nao mede nada.
+
+    - nodes: nos visitados, e depth_nodes: os mesmos, por nivel (ply)
+    - leaf_evaluations: nos avaliados pela heuristica ou pela utilidade
+    - cutoffs e first_move_cutoffs: cortes alfa-beta, e os que aconteceram
+      ja no primeiro filho
+    - generation_time, mark_time e evaluation_time: segundos gastos gerando
+      jogadas, marcando/desmarcando jogadas e avaliando folhas
+    """
+    __slots__ = ["nodes", "depth_nodes", "leaf_evaluations", "cutoffs",
+                 "first_move_cutoffs", "generation_time", "mark_time",
+                 "evaluation_time"]
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.depth_nodes = {}
+        self.leaf_evaluations = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.generation_time = 0.0
+        self.mark_time = 0.0
+        self.evaluation_time = 0.0
+
+    def add_node(self, ply):
+        self.nodes += 1
+        self.depth_nodes[ply] = self.depth_nodes.get(ply, 0) + 1
+
+    def get_first_move_cutoff_rate(self):
+        """
+        Fracao dos cortes que aconteceram ja no primeiro filho buscado
+        """
+        if not self.cutoffs:
+            return 0.0
+        return self.first_move_cutoffs / float(self.cutoffs)
+
+    def get_effective_branching_factor(self):
+        """
+        Fator de ramificacao efetivo: b tal que b ** d eh o numero de nos no
+        nivel mais fundo d (em relacao aos nos da raiz)
+        """
+        if not self.depth_nodes:
+            return 0.0
+        depth = max(self.depth_nodes)
+        if depth == 0:
+            return 0.0
+        ratio = self.depth_nodes[depth] / float(self.depth_nodes.get(0, 1))
+        return ratio ** (1.0 / depth)
+
+    def as_dict(self):
+        """
+        Retorna os contadores num dicionario que pode ser escrito em JSON
+        """
+        return {
+            "nodes": self.nodes,
+            "depth_nodes": [self.depth_nodes[ply]
+                            for ply in sorted(self.depth_nodes)],
+            "leaf_evaluations": self.leaf_evaluations,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": self.get_first_move_cutoff_rate(),
+            "effective_branching_factor":
+                self.get_effective_branching_factor(),
+            "generation_time": self.generation_time,
+            "mark_time": self.mark_time,
+            "evaluation_time": self.evaluation_time
+        }
+
+    def format(self):
+        """
+        Retorna um resumo em texto, uma informacao por linha
+        """
+        return "\n".join([
+            "Nodes: %d" % self.nodes,
+            "Nodes per depth: %s" % " ".join(
+                str(self.depth_nodes[ply])
+                for ply in sorted(self.depth_nodes)),
+            "Leaf evaluations: %d" % self.leaf_evaluations,
+            "Cutoffs: %d (%.0f%% first move)" % (
+                self.cutoffs, self.get_first_move_cutoff_rate() * 100),
+            "Branching factor: %.2f" % self.get_effective_branching_factor(),
+            "Generation: %.3fs" % self.generation_time,
+            "Mark: %.3fs" % self.mark_time,
+            "Evaluation: %.3fs" % self.evaluation_time,
+        ])
+
+    def __repr__(self):
+        return ("SearchStats(nodes={}, cutoffs={}, " +
+                "first_move_cutoffs={})").format(
+            self.nodes, self.cutoffs, self.first_move_cutoffs)
@@ -0,0 +1,221 @@
+# encoding: utf-8
+import collections
+import time
+from .windows import THREE, OPEN_THREE, OPEN_TWO, get_cell_windows, \
+    get_window_cells
+from .constants import X_PLAYER, O_PLAYER
+from .zobrist import get_keys
+
+# Numero maximo de ameacas seguidas do atacante
+VCF_DEPTH = 12
+VCT_DEPTH = 6
+# Numero maximo de posicoes visitadas por uma busca
+MAX_NODES = 4000
+# O VCT tem muito mais jogadas por posicao
+VCT_MAX_NODES = 1000
+# Tempo maximo, em segundos, de cada busca, alem do limite de nos
+THREAT_BUDGET = 0.1
+
+BaseThreatBoard = collections.namedtuple(
+    "BaseThreatBoard", ["board", "windows", "player", "zobrist", "geometry"])
+
+
+class ThreatBoard(BaseThreatBoard):
+    """
+    Posicao da busca por ameacas: apenas o Bitboard, as janelas (Windows) e
+    o zobrist de um State. A busca so le as janelas, entao mark nao atualiza
+    as sequencias, a heuristica e o cache de State.mark
+    """
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state.board, state.windows, state.player, state.zobrist,
+                   state.geometry)
+
+    def mark(self, y, x):
+        player = self.player
+        board = self.board.mark(y, x, player)
+        cell = self.geometry.cell_index(y, x)
+        return ThreatBoard(
+            board=board,
+            windows=self.windows.mark(y, x, player, board),
+            player=O_PLAYER if player == X_PLAYER else X_PLAYER,
+            zobrist=self.zobrist ^ get_keys(self.geometry)[player][cell],
+            geometry=self.geometry
+        )
+
+
+class ThreatSearch(object):
+    """
+    Busca no espaco de ameacas: o atacante so faz jogadas que obrigam uma
+    resposta (quatros e, no VCT, tres abertos) e o defensor so responde a
+    elas. Como o numero de jogadas eh muito pequeno, a busca vai fundo.
+
+    - VCF (victory by continuous fours): so quatros, com uma unica defesa
+    - VCT (victory by continuous threats): tambem tres abertos, e o atacante
+      precisa vencer contra todas as defesas
+    """
+    __slots__ = ["attacker", "defender", "allow_threes", "max_nodes", "nodes",
+                 "deadline", "failed", "cancel"]
+
+    def __init__(self, attacker, allow_threes=False, max_nodes=MAX_NODES,
+                 cancel=None, deadline=None):
+        self.attacker = attacker
+        self.defender = O_PLAYER if attacker == X_PLAYER else X_PLAYER
+        self.allow_threes = allow_threes
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        # Instante (time.time) em que a busca desiste, ou None
+        self.deadline = deadline
+        # threading.Event que interrompe a busca como o limite de nos
+        self.cancel = cancel
+        # Posicoes (zobrist) em que o atacante nao vence, com a profundidade
+        # usada
+        self.failed = {}
+
+    def search(self, state, depth):
+        """
+        Retorna a lista de jogadas (y, x), alternando atacante e defensor,
+        que leva a vitoria do atacante, ou None. state eh um ThreatBoard
+        """
+        if self.is_stopped():
+            return None
+        self.nodes += 1
+        windows = state.windows
+        wins = windows.get_winning_cells(self.attacker)
+        if wins:
+            return [min(wins)]
+        if depth <= 0 or self.failed.get(state.zobrist, -1) >= depth:
+            return None
+        blocks = windows.get_winning_cells(self.defender)
+        if len(blocks) > 1:
+            return None
+        for move in self.get_attacks(state, blocks):
+            line = self.search_defenses(state, move, depth)
+            if line is not None:
+                return line
+        if not self.is_stopped():
+            # Sem o limite de nos, a falha vale para outras ordens de jogadas
+            self.failed[state.zobrist] = depth
+        return None
+
+    def is_stopped(self):
+        """
+        Retorna se a busca atingiu o limite de nos ou de tempo, ou foi
+        cancelada
+        """
+        return self.nodes >= self.max_nodes or \
+            (self.deadline is not None and time.time() > self.deadline) or \
+            (self.cancel is not None and self.cancel.is_set())
+
+    def get_attacks(self, state, blocks):
+        """
+        Jogadas do atacante que criam ameacas, as que criam mais quatros
+        primeiro. Se o defensor tem um quatro, so o bloqueio eh possivel: no
+        VCF ele precisa ser um quatro; no VCT basta que o atacante continue
+        com um tres aberto depois dele
+        """
+        windows = state.windows
+        fours = windows.get_empty_cells(self.attacker, THREE)
+        if blocks:
+            if self.allow_threes:
+                return sorted(blocks)
+            return sorted(blocks & fours)
+        moves = sorted(fours, key=lambda cell: (
+            -self.count_threes_through(state, cell), cell))
+        if self.allow_threes:
+            # Casas que formam mais tres abertos primeiro
+            threes = self.get_three_cells(state)
+            moves.extend(sorted(
+                (cell for cell in threes if cell not in fours),
+                key=lambda cell: (-threes[cell], cell)))
+        return moves
+
+    def count_threes_through(self, state, cell):
+        windows = state.windows
+        threes = windows.threats[self.attacker, THREE]
+        cell = state.geometry.cell_index(*cell)
+        return sum(1 for window, _, _ in
+                   get_cell_windows(state.geometry, cell).windows
+                   if window in threes)
+
+    def get_three_cells(self, state):
+        """
+        Casas livres que criam um tres aberto para o atacante, com o numero
+        de janelas em que isso acontece. Apenas as janelas com pecas do
+        atacante sao percorridas
+        """
+        windows = state.windows
+        geometry = state.geometry
+        occupied = windows.board.occupied()
+        cells = collections.Counter()
+        for window in windows.threats[self.attacker, OPEN_TWO]:
+            for cell in get_window_cells(
+                    geometry, window, geometry.winning + 1)[1:-1]:
+                if not occupied >> cell & 1:
+                    cells[geometry.get_position(cell)] += 1
+        return cells
+
+    def search_defenses(self, state, move, depth):
+        child = state.mark(*move)
+        windows = child.windows
+        if windows.winner == self.attacker:
+            return [move]
+        if windows.get_winning_cells(self.defender):
+            # O defensor vence antes de responder a ameaca
+            return None
+        threats = windows.get_winning_cells(self.attacker)
+        if threats:
+            defenses = sorted(threats)
+        elif self.allow_threes and windows.count(self.attacker, OPEN_THREE):
+            # Um tres aberto sem resposta vira um quatro aberto
+            defenses = self.get_three_defenses(child)
+        else:
+            return None
+        line = None
+        for defense in defenses:
+            line = self.search(child.mark(*defense), depth - 1)
+            if line is None:
+                return None
+        if line is None:
+            return None
+        # O atacante vence contra todas as defesas; a linha mostra a ultima
+        return [move, defenses[-1]] + line
+
+    def get_three_defenses(self, state):
+        """
+        Respostas do defensor a um tres aberto: as casas livres das janelas
+        que formam os tres abertos e as jogadas que criam quatros para ele
+        """
+        windows = state.windows
+        cells = windows.get_empty_cells(self.attacker, OPEN_THREE)
+        cells |= windows.get_empty_cells(self.defender, THREE)
+        return sorted(cells)
+
+
+def find_vcf(state, depth=VCF_DEPTH, max_nodes=MAX_NODES,
+             budget=THREAT_BUDGET, cancel=None):
+    """
+    Procura uma vitoria por quatros seguidos para quem joga em state, por
+    ate budget segundos (None para nao limitar o tempo). Se cancel for
+    sinalizado, a busca para e nao encontra nada
+    """
+    return _find(state, False, depth, max_nodes, budget, cancel)
+
+
+def find_vct(state, depth=VCT_DEPTH, max_nodes=VCT_MAX_NODES,
+             budget=THREAT_BUDGET, cancel=None):
+    """
+    Procura uma vitoria por ameacas seguidas (quatros e tres abertos) para
+    quem joga em state
+    """
+    return _find(state, True, depth, max_nodes, budget, cancel)
+
+
+def _find(state, allow_threes, depth, max_nodes, budget, cancel):
+    deadline = None
+    if budget is not None:
+        deadline = time.time() + budget
+    search = ThreatSearch(state.player, allow_threes, max_nodes, cancel,
+                          deadline)
+    return search.search(ThreatBoard.from_state(state), depth)
@@ -0,0 +1,108 @@
+# encoding: utf-8
+import collections
+
+# Tipos de limite guardados junto com o valor de uma posicao
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Numero maximo de posicoes guardadas por padrao
+DEFAULT_SIZE = 1 << 18
+
+BaseEntry = collections.namedtuple(
+    "BaseEntry", ["value", "depth", "bound", "move"])
+
+
+class Entry(BaseEntry):
+    def is_usable(self, depth, alpha, beta):
+        """
+        Retorna se o valor guardado pode substituir uma busca com essa
+        profundidade e essa janela
+        """
+        if self.depth < depth:
+            return False
+        if self.bound == EXACT:
+            return True
+        if self.bound == LOWER_BOUND:
+            return self.value >= beta
+        return self.value <= alpha
+
+
+class TranspositionTable(object):
+    """
+    Tabela de transposicao com tamanho limitado. Quando cheia, a posicao
+    acessada ha mais tempo eh descartada (LRU)
+    """
+    __slots__ = ["entries", "size", "hits", "misses"]
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.entries = collections.OrderedDict()
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_key(self, state, player):
+        # O valor de uma posicao depende do jogador para quem ela eh avaliada
+        return state.zobrist, player
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, value, depth, bound, move=None):
+        old = self.entries.get(key)
+        if old is not None:
+            if old.depth > depth and old.bound == EXACT:
+                # Nao troca um resultado exato por uma busca mais rasa
+                self.entries.move_to_end(key)
+                return
+            if move is None:
+                move = old.move
+        self.entries[key] = Entry(value, depth, bound, move)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def get_line(self, state, player, length):
+        """
+        Retorna ate length jogadas da variacao principal guardada a partir de
+        state, seguindo a melhor jogada de cada posicao enquanto ela estiver
+        na tabela. A consulta nao altera a ordem do LRU nem os contadores
+        """
+        line = []
+        while len(line) < length and not state.finished():
+            entry = self.entries.get(self.get_key(state, player))
+            if entry is None or not entry.move:
+                break
+            y, x = entry.move
+            if state.is_marked(y, x):
+                # Colisao de chaves: a jogada nao pertence a esta posicao
+                break
+            line.append((y, x))
+            state = state.mark(y, x)
+        return line
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def get_bound(value, alpha, beta):
+    """
+    Classifica o resultado de uma busca fail-hard feita na janela
+    (alpha, beta)
+    """
+    if value <= alpha:
+        return UPPER_BOUND
+    if value >= beta:
+        return LOWER_BOUND
+    return EXACT
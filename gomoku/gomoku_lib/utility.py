@@ -1,3 +1,21 @@
+def get_utility(count, next_count, move_count, won):
+    """
+    Valor de um estado final a partir do numero de sequencias do jogador
+    avaliado (count) e do outro (next_count). Compartilhado com o
+    searchboard.SearchBoard
+    """
+    if next_count > count:
+        utlty = 100000
+    else:
+        utlty = 1000
+
+    utlty /= float(move_count)
+
+    if not won:
+        utlty *= -1
+
+    return utlty
+
 def evaluate(player, state):
     sequences = state.get_sequences()
     if state.player == player:
@@ -5,25 +23,7 @@ def evaluate(player, state):
     else:
         next_player = state.player
     computer = sequences.get_by_player(player)
-    player = sequences.get_by_player(next_player)
-    
-    pseq = len(player)
-    cseq = len(computer)
-    pmax = len(max(player, key=len))
-    cmax = len(max(computer, key=len))
-    
-    if pseq > cseq:
-        utlty = 100000
-    else:
-        utlty = 1000
-    
-    utlty /= float(state.move_count)
-        
-    if not state.check_won(player):
-        utlty *= -1
-    elif state.check_won(player):
-        utlty *= 1
-    else:
-        utlty *= 0
+    opponent = sequences.get_by_player(next_player)
 
-    return utlty
\ No newline at end of file
+    return get_utility(len(computer), len(opponent), state.move_count,
+                       state.check_won(player))
@@ -0,0 +1,310 @@
+# encoding: utf-8
+import collections
+import functools
+from .constants import OPTIMIZED_DIRECTIONS, X_PLAYER, O_PLAYER
+from .bitboard import Bitboard
+
+PLAYERS = (X_PLAYER, O_PLAYER)
+
+
+# Numero de direcoes das janelas. Uma janela eh identificada pela sua
+# primeira casa e pela direcao: start * AXIS_COUNT + axis
+AXIS_COUNT = len(OPTIMIZED_DIRECTIONS)
+# Numero de casas cujas janelas ficam guardadas (veja get_cell_windows)
+CELL_CACHE_SIZE = 4096
+
+
+def _get_mask(step, positions):
+    """
+    Mascara relativa das casas nas posicoes positions de uma janela com
+    passo step: os bits delas num Bitboard sao (bits >> start) & mask
+    """
+    mask = 0
+    for position in positions:
+        mask |= 1 << (position * step)
+    return mask
+
+
+WindowTables = collections.namedtuple(
+    "WindowTables", ["steps", "masks", "open_masks", "open_end_masks"]
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_window_tables(geometry):
+    """
+    Pre-calcula, para cada direcao, o passo (em cell_index) das janelas e as
+    mascaras (veja _get_mask) das casas de uma janela de geometry.winning
+    casas (masks), das casas internas de uma janela aberta, com uma casa a
+    mais de cada lado (open_masks), e das pontas dela (open_end_masks). As
+    mascaras so dependem da direcao e da largura do tabuleiro, entao as
+    tabelas nao crescem com a area
+    """
+    winning = geometry.winning
+    steps = []
+    for direction in OPTIMIZED_DIRECTIONS:
+        dy, dx = direction(0, 0, 1)
+        steps.append(dy * geometry.width + dx)
+    return WindowTables(
+        steps=tuple(steps),
+        masks=tuple(_get_mask(step, range(winning)) for step in steps),
+        open_masks=tuple(_get_mask(step, range(1, winning))
+                         for step in steps),
+        open_end_masks=tuple(_get_mask(step, (0, winning))
+                             for step in steps)
+    )
+
+
+def _get_windows_through(geometry, y, x, length, positions):
+    """
+    Retorna as janelas de length casas que tem a casa (y, x) numa das
+    posicoes positions
+    """
+    windows = []
+    for axis, direction in enumerate(OPTIMIZED_DIRECTIONS):
+        for position in positions:
+            sy, sx = direction(y, x, -position)
+            ey, ex = direction(sy, sx, length - 1)
+            if geometry.is_valid_position(sy, sx) and \
+                    geometry.is_valid_position(ey, ex):
+                windows.append(
+                    geometry.cell_index(sy, sx) * AXIS_COUNT + axis)
+    return windows
+
+
+CellWindows = collections.namedtuple(
+    "CellWindows",
+    ["low", "span", "windows", "open_windows", "open_window_ends"]
+)
+
+
+@functools.lru_cache(maxsize=CELL_CACHE_SIZE)
+def get_cell_windows(geometry, cell):
+    """
+    Calcula as janelas que passam pela casa, na primeira vez que ela eh
+    jogada ou consultada:
+
+    - windows: as janelas de geometry.winning casas que a tem; uma delas
+      completa por um jogador eh uma vitoria
+    - open_windows: as janelas abertas (com uma casa a mais de cada lado,
+      que precisam estar livres) que a tem entre as casas internas
+    - open_window_ends: as janelas abertas que a tem numa das pontas
+
+    Todas as casas lidas dessas janelas estao a menos de geometry.winning
+    passos da casa, no trecho (bits >> low) & span de um Bitboard. Cada
+    janela vem com a posicao da sua primeira casa nesse trecho e a mascara
+    das suas casas (das internas e das pontas, nas janelas abertas)
+    """
+    tables = get_window_tables(geometry)
+    winning = geometry.winning
+    y, x = geometry.get_position(cell)
+    reach = (winning - 1) * max(tables.steps)
+    low = max(cell - reach, 0)
+
+    def with_masks(windows, *masks):
+        return tuple(
+            (window, window // AXIS_COUNT - low) +
+            tuple(axis_masks[window % AXIS_COUNT] for axis_masks in masks)
+            for window in windows)
+    return CellWindows(
+        low=low,
+        span=(1 << (cell + reach + 1 - low)) - 1,
+        windows=with_masks(
+            _get_windows_through(geometry, y, x, winning, range(winning)),
+            tables.masks),
+        open_windows=with_masks(
+            _get_windows_through(geometry, y, x, winning + 1,
+                                 range(1, winning)),
+            tables.open_masks, tables.open_end_masks),
+        open_window_ends=tuple(
+            _get_windows_through(geometry, y, x, winning + 1, (0, winning)))
+    )
+
+
+def get_window_cells(geometry, window, length):
+    """
+    Retorna as casas (cell_index) da janela de length casas
+    """
+    start, axis = divmod(window, AXIS_COUNT)
+    step = get_window_tables(geometry).steps[axis]
+    return range(start, start + length * step, step)
+
+# Tipos de ameaca contados para cada jogador
+FOUR = "four"
+THREE = "three"
+OPEN_FOUR = "open_four"
+OPEN_THREE = "open_three"
+OPEN_TWO = "open_two"
+THREATS = (FOUR, THREE, OPEN_FOUR, OPEN_THREE, OPEN_TWO)
+
+
+def count_bits(value):
+    return bin(value).count("1")
+
+
+class ThreatsChanges(object):
+    """
+    Acumula as mudancas de Windows.mark nos conjuntos de ameacas. Cada
+    conjunto so eh copiado na primeira vez que muda; os outros continuam
+    compartilhados com o Windows anterior
+    """
+    __slots__ = ["threats", "copied"]
+
+    def __init__(self, threats):
+        self.threats = dict(threats)
+        self.copied = set()
+
+    def get_changed(self, key):
+        if key not in self.copied:
+            self.threats[key] = set(self.threats[key])
+            self.copied.add(key)
+        return self.threats[key]
+
+    def add(self, key, window):
+        if window not in self.threats[key]:
+            self.get_changed(key).add(window)
+
+    def discard(self, key, window):
+        if window in self.threats[key]:
+            self.get_changed(key).discard(window)
+
+    def get_threats(self):
+        for key in self.copied:
+            self.threats[key] = frozenset(self.threats[key])
+        return self.threats
+
+
+BaseWindows = collections.namedtuple(
+    "BaseWindows", ["threats", "winner", "board", "geometry"]
+)
+
+
+class Windows(BaseWindows):
+    """
+    Ameacas mantidas incrementalmente por janela. As pecas de cada janela
+    sao contadas no Bitboard do estado (board), com as mascaras de
+    get_cell_windows, entao mark so olha as janelas que passam pela casa
+    jogada e so copia os conjuntos de ameacas que mudam: o custo nao depende
+    do numero de pecas.
+
+    - threats: para cada jogador e tipo de ameaca, o conjunto das janelas que
+      formam aquela ameaca. Os nomes sao os do tabuleiro padrao (5 pecas para
+      vencer); com geometry.winning = w, um FOUR tem w - 1 pecas, um THREE
+      w - 2, e assim por diante:
+        - FOUR: janela de geometry.winning casas com 4 pecas do jogador e
+          nenhuma do outro
+        - THREE: o mesmo, com 3 pecas do jogador
+        - OPEN_FOUR: janela aberta (com uma casa a mais de cada lado) com
+          as pontas livres e as 4 casas internas do jogador (_XXXX_)
+        - OPEN_THREE: janela aberta com as pontas livres, 3 casas internas
+          do jogador e uma livre (_XXX._, _X.XX_...)
+        - OPEN_TWO: o mesmo, com 2 casas internas do jogador; uma jogada
+          nela forma um OPEN_THREE
+    - winner: o jogador que completou uma janela, ou None
+    - board: o Bitboard com as pecas, o mesmo de State.board
+    """
+
+    @classmethod
+    def get_initial_windows(cls, geometry):
+        return cls(
+            threats={(player, threat): frozenset()
+                     for player in PLAYERS for threat in THREATS},
+            winner=None,
+            board=Bitboard.get_empty(geometry),
+            geometry=geometry
+        )
+
+    def mark(self, y, x, player, board):
+        """
+        Retorna as janelas depois da jogada (y, x) de player. board eh o
+        Bitboard ja com a jogada
+        """
+        cell = self.geometry.cell_index(y, x)
+        opponent = O_PLAYER if player == X_PLAYER else X_PLAYER
+        winning = self.geometry.winning
+        threats = ThreatsChanges(self.threats)
+        winner = self.winner
+        # So o trecho do tabuleiro perto da casa eh lido, para que o custo
+        # nao dependa do tamanho dos inteiros do Bitboard
+        cell_windows = get_cell_windows(self.geometry, cell)
+        low, span = cell_windows.low, cell_windows.span
+        own = board.get_bits(player) >> low & span
+        other = board.get_bits(opponent) >> low & span
+
+        for window, start, mask in cell_windows.windows:
+            if other >> start & mask:
+                # A janela esta morta para os dois jogadores agora
+                threats.discard((opponent, FOUR), window)
+                threats.discard((opponent, THREE), window)
+                continue
+            count = count_bits(own >> start & mask)
+            if count == winning:
+                threats.discard((player, FOUR), window)
+                winner = player
+            elif count == winning - 1:
+                threats.discard((player, THREE), window)
+                threats.add((player, FOUR), window)
+            elif count == winning - 2:
+                threats.add((player, THREE), window)
+
+        occupied = own | other
+        for window, start, mask, end_mask in cell_windows.open_windows:
+            if other >> start & mask:
+                threats.discard((opponent, OPEN_FOUR), window)
+                threats.discard((opponent, OPEN_THREE), window)
+                threats.discard((opponent, OPEN_TWO), window)
+                continue
+            if occupied >> start & end_mask:
+                continue
+            count = count_bits(own >> start & mask)
+            if count == winning - 1:
+                threats.discard((player, OPEN_THREE), window)
+                threats.add((player, OPEN_FOUR), window)
+            elif count == winning - 2:
+                threats.discard((player, OPEN_TWO), window)
+                threats.add((player, OPEN_THREE), window)
+            elif count == winning - 3:
+                threats.add((player, OPEN_TWO), window)
+        for window in cell_windows.open_window_ends:
+            for key in PLAYERS:
+                threats.discard((key, OPEN_FOUR), window)
+                threats.discard((key, OPEN_THREE), window)
+                threats.discard((key, OPEN_TWO), window)
+
+        return Windows(
+            threats=threats.get_threats(),
+            winner=winner,
+            board=board,
+            geometry=self.geometry
+        )
+
+    def count(self, player, threat):
+        """
+        Retorna quantas janelas formam a ameaca threat para o jogador. Uma
+        mesma linha pode ser contada por mais de uma janela (um _XXXX_ tem
+        duas janelas FOUR, por exemplo)
+        """
+        return len(self.threats[player, threat])
+
+    def is_occupied(self, cell):
+        return bool(self.board.occupied() >> cell & 1)
+
+    def get_empty_cells(self, player, threat):
+        """
+        Retorna as casas (y, x) livres das janelas que formam a ameaca. Para
+        FOUR, sao as casas que completam uma janela (vitoria); para THREE, as
+        casas que formam um FOUR
+        """
+        length = self.geometry.winning
+        if threat not in (FOUR, THREE):
+            length += 1
+        occupied = self.board.occupied()
+        cells = set()
+        for window in self.threats[player, threat]:
+            for cell in get_window_cells(self.geometry, window, length):
+                if not occupied >> cell & 1:
+                    cells.add(self.geometry.get_position(cell))
+        return cells
+
+    def get_winning_cells(self, player):
+        return self.get_empty_cells(player, FOUR)
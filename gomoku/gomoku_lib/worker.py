@@ -0,0 +1,59 @@
+# encoding: utf-8
+import threading
+
+
+class SearchWorker(object):
+    """
+    Executa fn(cancel) numa thread separada, para que a interface continue
+    respondendo durante a busca. cancel eh um threading.Event: a busca deve
+    parar assim que ele for sinalizado, retornando o melhor resultado que
+    tiver encontrado ate entao.
+
+    O resultado (ou a excecao levantada por fn) fica guardado ate ser lido
+    com get_result, que deve ser chamado apenas depois de is_done
+    """
+    __slots__ = ["fn", "cancel_event", "thread", "result", "error"]
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        # A thread nao impede o programa de terminar
+        self.thread.daemon = True
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.fn(self.cancel_event)
+        except Exception as e:
+            self.error = e
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        """
+        Pede que a busca pare. O resultado continua disponivel em get_result
+        quando a thread terminar
+        """
+        self.cancel_event.set()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def is_running(self):
+        return self.thread.is_alive()
+
+    def is_done(self):
+        return self.thread.ident is not None and not self.thread.is_alive()
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return self.is_done()
+
+    def get_result(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
@@ -0,0 +1,20 @@
+# encoding: utf-8
+import functools
+import random
+from .constants import X_PLAYER, O_PLAYER
+
+# Semente fixa, para que o hash de uma posicao seja o mesmo entre execucoes
+ZOBRIST_SEED = 5430
+
+
+@functools.lru_cache(maxsize=None)
+def get_keys(geometry):
+    """
+    Retorna, para cada jogador, o valor que deve ser combinado (xor) ao hash
+    de uma posicao quando ele marca cada casa (pelo cell_index)
+    """
+    rng = random.Random(ZOBRIST_SEED)
+    return {
+        player: tuple(rng.getrandbits(64) for _ in range(geometry.size))
+        for player in (X_PLAYER, O_PLAYER)
+    }
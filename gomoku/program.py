@@ -1,18 +1,82 @@
 # encoding: utf-8
+import os
+import time
 from gomoku_lib.display import Display
 from gomoku_lib.state import State
 from gomoku_lib.events import Mouse
-from gomoku_lib.exceptions import StopPropagation, Quit
-from gomoku_lib.minimax import minimax
+from gomoku_lib.exceptions import StopPropagation, Quit, InvalidGeometry, \
+    SearchFailed, InvalidRecord, GameNotSaved, GameWarning, InvalidBook, \
+    BookNotLoaded
+from gomoku_lib.minimax import iterative_deepening, search_root
+from gomoku_lib.negamax import principal_variation
+from gomoku_lib.transposition import TranspositionTable
+from gomoku_lib.ordering import MoveOrdering
+from gomoku_lib.stats import SearchStats
+from gomoku_lib.threats import find_vcf, find_vct
+from gomoku_lib.book import load_book
+from gomoku_lib.worker import SearchWorker
+from gomoku_lib.geometry import Geometry, DEFAULT_GEOMETRY
+from gomoku_lib.record import open_writer
 
 __all__ = ["Display", "State"]
 inf = float('inf')
+# Compartilhada entre as jogadas da IA, para reaproveitar as buscas anteriores
+table = TranspositionTable()
+ordering = MoveOrdering()
+# Tempo maximo, em segundos, que a IA pode usar para escolher uma jogada
+TIME_BUDGET = 2.0
+# Algoritmo de busca usado pela IA ("minimax" ou "pvs") e a meia largura das
+# janelas de aspiracao, como fracao do valor anterior (None desativa)
+SEARCHES = {"minimax": search_root, "pvs": principal_variation}
+SEARCH = "pvs"
+ASPIRATION = 0.5
+# Procura vitorias forcadas por ameacas antes da busca: por quatros sempre, e
+# tambem por tres abertos se USE_VCT for verdadeiro
+USE_VCT = True
+# Livro de aberturas (gerado com python -m gomoku_lib.book), consultado antes
+# de qualquer busca quando o arquivo existe. Se ele nao puder ser usado, o
+# jogo continua sem livro e o aviso (book_warning) eh mostrado no inicio
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "book.bin")
+book_warning = None
+try:
+    book = load_book(BOOK_PATH)
+except InvalidBook:
+    book = None
+    book_warning = BookNotLoaded(BOOK_PATH, "not an opening book file")
+except OSError as e:
+    book = None
+    book_warning = BookNotLoaded(BOOK_PATH, e.strerror or e)
+# Arquivo onde cada partida terminada eh acrescentada (veja record.py), ou
+# None para nao gravar as partidas. Definido pela opcao --records
+RECORDS_PATH = None
+# Enquanto o jogador pensa, a IA busca a resposta para a jogada que ela
+# espera dele (a seguinte na variacao principal), por ate PONDER_BUDGET
+# segundos. Se o jogador fizer essa jogada, a busca continua como a busca da
+# IA; caso contrario eh descartada, mas a tabela de transposicao fica
+PONDER = True
+PONDER_BUDGET = 60.0
+# SearchWorker da jogada da IA em andamento (None quando nao ha busca) e o
+# instante em que ela deve ser interrompida (None quando nao ha limite)
+ai_worker = None
+ai_deadline = None
+# SearchFailed da busca que falhou enquanto a busca refeita esta em andamento
+ai_error = None
+# (SearchWorker, jogada esperada, inicio) da busca no tempo do jogador
+ponder = None
+# Busca no tempo do jogador descartada que ainda pode estar terminando (veja
+# start_search). poll_ai a esquece quando ela termina
+abandoned = None
 
 def process_mouse_click(display, state, ev):
     if not ev.match(Mouse.LEFT_CLICKED):
         return state
+    if ai_worker is not None:
+        # A IA ainda esta pensando: a vez nao eh do jogador
+        return state
     y, x = display.locate(ev.y, ev.x)
     state = state.mark(y, x)
+    take_ponder((y, x))
     return display.trigger(display.MARK_EVENT, state)
 
 
@@ -38,13 +102,197 @@ def check_won(display, state):
         display.off(display.MARK_EVENT)
         display.off(display.MOUSE_EVENT)
         display.once(display.MOUSE_EVENT, finish)
+        try:
+            save_game(state)
+        except GameWarning as e:
+            state = state.display("{} - {}".format(state.message, e))
         raise StopPropagation(state)
     return state
 
 
+def save_game(state):
+    """
+    Acrescenta a partida terminada em RECORDS_PATH. Se o arquivo nao for um
+    arquivo de partidas ou nao puder ser escrito, emite GameNotSaved
+    """
+    if RECORDS_PATH is None:
+        return
+    try:
+        with open_writer(RECORDS_PATH) as writer:
+            writer.write_state(state)
+    except InvalidRecord:
+        raise GameNotSaved(RECORDS_PATH, "not a game record file")
+    except OSError as e:
+        raise GameNotSaved(RECORDS_PATH, e.strerror or e)
+
+
+def find_threat_win(state):
+    """
+    Procura uma vitoria por ameacas (VCF, depois VCT). A busca eh limitada
+    por numero de nos e por tempo (threats.THREAT_BUDGET), entao nao eh
+    interrompida por cancel: uma linha vencedora encontrada vale mais que a
+    resposta imediata
+    """
+    line = find_vcf(state)
+    if line is None and USE_VCT:
+        line = find_vct(state)
+    return line
+
+
+def search_move(state, cancel=None, budget=None):
+    """
+    Escolhe a jogada da IA, retornando o novo estado e o SearchStats da busca
+    principal (None quando ela nao foi necessaria). Se cancel for sinalizado,
+    a busca termina com a melhor jogada encontrada ate entao: a jogada
+    forcada, a busca por ameacas e a profundidade 1 terminam mesmo assim.
+    budget eh o tempo maximo, TIME_BUDGET por padrao
+    """
+    if budget is None:
+        budget = TIME_BUDGET
+    # Vitoria em uma jogada ou bloqueio obrigatorio: nao ha o que buscar
+    move = state.get_forced_move()
+    if move is not None:
+        return state.mark(*move), None
+    if book is not None:
+        move = book.probe(state)
+        if move is not None:
+            return state.mark(*move), None
+    started = time.time()
+    line = find_threat_win(state)
+    if line is not None:
+        return state.mark(*line[0]), None
+    # O tempo gasto na busca por ameacas sai do tempo da busca principal
+    budget = max(budget - (time.time() - started), 0)
+    stats = SearchStats()
+    value, s = iterative_deepening(state.player, state, budget, table,
+                                   ordering=ordering, stats=stats,
+                                   search=SEARCHES[SEARCH],
+                                   aspiration=ASPIRATION, cancel=cancel)
+    return s, stats
+
+
+def start_search(search):
+    """
+    Inicia search(cancel) num SearchWorker. Se uma busca descartada ainda
+    esta terminando, a nova espera por ela na propria thread (e nao na da
+    interface), para que as duas nao usem a tabela ao mesmo tempo
+    """
+    previous = abandoned
+
+    def run(cancel):
+        if previous is not None:
+            previous.wait()
+        return search(cancel)
+    return SearchWorker(run).start()
+
+
 def run_ai(display, state, *args, **kwargs):
-    value, s = minimax(state.player, state, 2, -inf, inf, True)
-    return display.trigger(display.MARK_EVENT, s)
+    """
+    Inicia a busca da IA numa thread. A jogada eh aplicada por poll_ai quando
+    a busca terminar
+    """
+    global ai_worker
+    if ai_worker is None:
+        ai_worker = start_search(lambda cancel: search_move(state, cancel))
+    # Senao, a busca feita no tempo do jogador ja eh a desta jogada
+    return state.display("Thinking... (press any key to play now)")
+
+
+def poll_ai(display, state, *args, **kwargs):
+    global ai_worker, ai_deadline, ai_error, abandoned
+    if abandoned is not None and abandoned.is_done():
+        # O resultado da busca descartada nao eh usado
+        abandoned = None
+    if ai_worker is None:
+        return state
+    if ai_deadline is not None and time.time() >= ai_deadline:
+        ai_worker.cancel()
+    if not ai_worker.is_done():
+        return state
+    worker, ai_worker, ai_deadline = ai_worker, None, None
+    try:
+        new_state, stats = worker.get_result()
+    except Exception as e:
+        if ai_error is None:
+            # A excecao da thread nao pode derrubar o loop da interface: a
+            # busca eh refeita num novo SearchWorker, que continua sendo
+            # acompanhado aqui, e o erro eh mostrado como um aviso
+            ai_error = SearchFailed(e)
+            ai_worker = start_search(
+                lambda cancel: search_move(state, cancel))
+            return state.display(str(ai_error))
+        # A busca refeita tambem falhou: a primeira jogada gerada eh jogada
+        new_state, stats = state.mark(*next(state.get_next_moves())), None
+    if ai_error is not None:
+        new_state = new_state.display(str(ai_error))
+        ai_error = None
+    if stats is not None:
+        display.search_stats = stats
+    state = display.trigger(display.MARK_EVENT, new_state)
+    start_pondering(display, state)
+    return state
+
+
+def start_pondering(display, state):
+    """
+    Comeca a buscar, no tempo do jogador, a resposta para a jogada que a IA
+    espera dele
+    """
+    global ponder
+    if not PONDER or state.finished() or \
+            state.player in display.computer_player:
+        return
+    # A tabela guarda as posicoes do ponto de vista da IA, que acabou de jogar
+    line = table.get_line(state, state.last_move.player, 1)
+    if not line:
+        return
+    expected = state.mark(*line[0])
+    worker = start_search(
+        lambda cancel: search_move(expected, cancel, PONDER_BUDGET))
+    ponder = worker, line[0], time.time()
+
+
+def stop_pondering():
+    """
+    Descarta a busca feita no tempo do jogador. A interface nao espera a
+    thread terminar: a proxima busca espera por ela (veja start_search)
+    """
+    global ponder, abandoned
+    if ponder is None:
+        return
+    worker = ponder[0]
+    ponder = None
+    worker.cancel()
+    abandoned = worker
+
+
+def take_ponder(move):
+    """
+    Chamado com a jogada do jogador. Se era a esperada, a busca feita no tempo
+    dele passa a ser a busca da IA, com o tempo que ela ja gastou descontado
+    de TIME_BUDGET
+    """
+    global ponder, ai_worker, ai_deadline
+    if ponder is None:
+        return
+    worker, expected, started = ponder
+    if tuple(move) != expected:
+        stop_pondering()
+        return
+    ponder = None
+    ai_worker = worker
+    ai_deadline = started + TIME_BUDGET
+
+
+def abort_ai(display, state, *args, **kwargs):
+    """
+    Qualquer tecla durante a busca faz a IA jogar a melhor jogada que ja
+    encontrou
+    """
+    if ai_worker is None:
+        return state
+    ai_worker.cancel()
+    raise StopPropagation(state)
 
 
 def should_ai_run(display, state, *args, **kwargs):
@@ -60,10 +308,12 @@ def undo(display, state, ev, *args, **kwargs):
     Desfaz o status ate a ultima jogada do jogador..
     """
     if ev.upper() == "U" and state.player not in display.computer_player:
-        p = state.parent
-        while state.last_move == p.last_move or p.player != state.player:
-            p = p.parent
-        return p
+        # Volta duas jogadas (a do adversario e a do jogador), para que seja
+        # a vez do jogador de novo
+        ply = state.move_count - 2
+        if ply >= 0:
+            stop_pondering()
+            return state.rewind(ply)
     return state
 
 def clear_message(display, state, ev, *args, **kwargs):
@@ -72,12 +322,34 @@ def clear_message(display, state, ev, *args, **kwargs):
     return state.display(None)
 
 if __name__ == "__main__":
-    state = State.get_initial_state()
-    display = Display()
+    import argparse
+    parser = argparse.ArgumentParser(description="Gomoku")
+    parser.add_argument("--width", type=int, default=DEFAULT_GEOMETRY.width)
+    parser.add_argument("--height", type=int,
+                        default=DEFAULT_GEOMETRY.height)
+    parser.add_argument("--winning", type=int,
+                        default=DEFAULT_GEOMETRY.winning,
+                        help="pecas em sequencia para vencer")
+    parser.add_argument("--records", metavar="PATH",
+                        help="arquivo onde as partidas terminadas sao "
+                             "acrescentadas (por padrao nao sao gravadas)")
+    args = parser.parse_args()
+    RECORDS_PATH = args.records
+    try:
+        geometry = Geometry(args.width, args.height, args.winning)
+    except InvalidGeometry as e:
+        parser.error(str(e))
+    state = State.get_initial_state(geometry)
+    if book_warning is not None:
+        state = state.display(str(book_warning))
+    display = Display(geometry)
     display.on(display.MOUSE_EVENT, process_mouse_click)
     display.on(display.MARK_EVENT, should_ai_run)
     display.on(display.MARK_EVENT, check_won)
     display.on(display.KEY_EVENT, undo)
     display.on(display.IA_MOVE, run_ai)
     display.on(display.MOUSE_EVENT, clear_message)
+    display.on(display.IDLE_EVENT, poll_ai)
+    # Registrado por ultimo para ser o primeiro a receber as teclas
+    display.on(display.KEY_EVENT, abort_ai)
     display.loop(state)
\ No newline at end of file
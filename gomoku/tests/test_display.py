@@ -0,0 +1,95 @@
+# encoding: utf-8
+import unittest
+from unittest import mock
+from gomoku_lib.display import Display
+from gomoku_lib.state import State
+from gomoku_lib.stats import SearchStats
+
+
+class FakeWindow(object):
+    """
+    Janela do curses que guarda os caracteres escritos e conta as escritas
+    """
+
+    def __init__(self):
+        self.screen = {}
+        self.writes = 0
+        self.cursor = None
+
+    def erase(self):
+        self.screen = {}
+        self.writes += 1
+
+    def addch(self, y, x, char, attr=0):
+        self.screen[y, x] = chr(char)
+        self.writes += 1
+
+    def addstr(self, y, x, text):
+        for i, char in enumerate(text):
+            self.screen[y, x + i] = char
+        self.writes += 1
+
+    def move(self, y, x):
+        self.cursor = y, x
+
+    def clrtoeol(self):
+        y, x = self.cursor
+        for key in [key for key in self.screen
+                    if key[0] == y and key[1] >= x]:
+            del self.screen[key]
+        self.writes += 1
+
+    def refresh(self):
+        pass
+
+
+def get_display():
+    display = Display()
+    display.window = FakeWindow()
+    display.has_colors = False
+    return display
+
+
+def get_text(display):
+    rows = {}
+    for (y, x), char in sorted(display.window.screen.items()):
+        rows[y] = rows.get(y, "") + char
+    return "\n".join(rows[y] for y in sorted(rows))
+
+
+@mock.patch("time.time", return_value=1000.0)
+class DrawTest(unittest.TestCase):
+
+    def assert_same_as_full_draw(self, display, state):
+        full = get_display()
+        full.search_stats = display.search_stats
+        full.draw(state)
+        self.assertEqual(get_text(display), get_text(full))
+
+    def test_incremental_draw_matches_full_draw(self, _):
+        display = get_display()
+        states = [State.get_initial_state().display("hello\nworld")]
+        for move in [(7, 7), (7, 6), (6, 6), (5, 5), (7, 5)]:
+            states.append(states[-1].mark(*move))
+        states.append(states[-1].display(None))
+        states.append(states[-1].rewind(2))
+        states.append(states[-1].mark(1, 1).display("a long message " * 8))
+        for state in states:
+            display.draw(state)
+            self.assert_same_as_full_draw(display, state)
+        display.window.writes = 0
+        display.draw(states[-1])
+        self.assertEqual(display.window.writes, 0)
+
+    def test_message_is_redrawn_after_a_search(self, _):
+        display = get_display()
+        state = State.from_moves([(7, 7), (7, 6)]).display("Thinking...")
+        display.draw(state)
+        display.search_stats = SearchStats()
+        state = state.mark(6, 6).display("The player O won")
+        display.draw(state)
+        text = get_text(display)
+        self.assertIn("Last search", text)
+        self.assertIn("The player O won", text)
+        self.assertNotIn("Thinking", text)
+        self.assert_same_as_full_draw(display, state)
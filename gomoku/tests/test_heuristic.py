@@ -0,0 +1,96 @@
+# encoding: utf-8
+import random
+import unittest
+from gomoku_lib.state import State
+from gomoku_lib.geometry import Geometry, DEFAULT_GEOMETRY
+from gomoku_lib.heuristic import get_scores, evaluate, evaluate_from_scratch
+from gomoku_lib.constants import X_PLAYER, O_PLAYER
+
+PLAYERS = (X_PLAYER, O_PLAYER)
+
+
+def play_random_games(geometry, games, length):
+    """
+    Gera os estados de partidas aleatorias entre as jogadas geradas por
+    State.get_next_moves
+    """
+    for seed in range(games):
+        rng = random.Random(seed)
+        state = State.get_initial_state(geometry)
+        for _ in range(length):
+            if state.finished():
+                break
+            state = state.mark(*rng.choice(list(state.get_next_moves())[:6]))
+            yield state
+
+
+class IncrementalScoresTest(unittest.TestCase):
+    """
+    As somas de State.get_scores (heuristic.Scores), incrementais ou nao,
+    devem ser as mesmas do calculo do zero
+    """
+
+    def check_games(self, geometry, games, length, step=1):
+        """
+        Confere as somas a cada step estados: com step maior que 1, parte
+        dos estados nunca tem as somas calculadas
+        """
+        states = play_random_games(geometry, games, length)
+        for number, state in enumerate(states):
+            if number % step:
+                continue
+            scores = get_scores(state)
+            for player in PLAYERS:
+                self.assertEqual(state.get_scores().get(player, 0),
+                                 scores.get(player, 0))
+                self.assertEqual(evaluate(player, state),
+                                 evaluate_from_scratch(player, state))
+
+    def test_default_geometry(self):
+        self.check_games(DEFAULT_GEOMETRY, 10, 60)
+
+    def test_non_default_winning(self):
+        self.check_games(Geometry(9, 9, 4), 10, 40)
+        self.check_games(Geometry(19, 19, 6), 5, 60)
+
+    def test_scores_computed_lazily(self):
+        self.check_games(DEFAULT_GEOMETRY, 10, 60, step=3)
+        state = State.from_moves([(7, 7), (7, 8), (8, 8)])
+        self.assertIsNone(state.scores.values)
+        # O filho de um estado com as somas usa as do pai
+        child = state.mark(9, 9)
+        self.assertIsNone(child.scores.parent)
+        state.get_scores()
+        child = state.mark(9, 9)
+        self.assertIs(child.scores.parent, state)
+        self.assertEqual(child.get_scores(), get_scores(child))
+        self.assertIsNone(child.scores.parent)
+
+
+class SequencesIndexTest(unittest.TestCase):
+    """
+    As consultas indexadas de Sequences devem retornar o mesmo que percorrer
+    todas as sequencias
+    """
+
+    def test_index_matches_scan(self):
+        geometry = DEFAULT_GEOMETRY
+        rng = random.Random(0)
+        for state in play_random_games(geometry, 5, 40):
+            sequences = state.get_sequences()
+            cells = [(state.last_move.y, state.last_move.x)]
+            cells += [(rng.randrange(geometry.height),
+                       rng.randrange(geometry.width)) for _ in range(3)]
+            for y, x in cells:
+                self.assertEqual(
+                    set(sequences.get_by_touching(y, x)),
+                    {seq for seq in sequences
+                     if seq.touches(y, x, geometry.winning)})
+                self.assertEqual(
+                    set(sequences.get_by_position(y, x)),
+                    {seq for seq in sequences
+                     if any((move.y, move.x) == (y, x) for move in seq)})
+            for player in PLAYERS:
+                self.assertEqual(
+                    list(sequences.get_by_player(player)),
+                    [seq for seq in sequences if seq.player == player])
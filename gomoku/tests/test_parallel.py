@@ -0,0 +1,49 @@
+# encoding: utf-8
+import multiprocessing
+import unittest
+from gomoku_lib.state import State
+from gomoku_lib.minimax import minimax
+from gomoku_lib import parallel
+from gomoku_lib.parallel import parallel_minimax
+
+inf = float('inf')
+POSITIONS = [
+    [(7, 7), (7, 6), (6, 6), (5, 5), (7, 5), (5, 7)],
+    [(7, 7), (8, 8), (6, 8), (8, 6)],
+]
+# Posicoes em que dois filhos da raiz empatam com o melhor valor
+TIES = [
+    ([(8, 8), (8, 7), (7, 6), (7, 7)], [(6, 7), (9, 7)]),
+    ([(6, 6), (5, 5), (4, 6)], [(7, 6), (8, 6)]),
+]
+
+
+class ParallelMinimaxTest(unittest.TestCase):
+
+    def test_same_result_as_serial_minimax(self):
+        for moves in POSITIONS:
+            state = State.from_moves(moves)
+            value, best = minimax(state.player, state, 2, -inf, inf, True)
+            for _ in range(3):
+                parallel_value, parallel_best = parallel_minimax(
+                    state.player, state, 2, workers=3)
+                self.assertEqual(parallel_value, value)
+                self.assertEqual(parallel_best.last_move, best.last_move)
+
+    def test_tied_child_is_exact_when_searched_last(self):
+        for moves, ties in TIES:
+            state = State.from_moves(moves)
+            value, best = minimax(state.player, state, 2, -inf, inf, True)
+            self.assertEqual(best.last_move[:2], ties[0])
+            # Outro processo ja encontrou o melhor valor com o segundo filho
+            parallel._init_worker(multiprocessing.Value("d", value))
+            self.assertEqual(
+                parallel._search_child(state.player, moves, state.geometry,
+                                       ties[0], 2),
+                (value, True))
+
+    def test_tied_positions_pick_the_first_move(self):
+        for moves, ties in TIES:
+            state = State.from_moves(moves)
+            _, best = parallel_minimax(state.player, state, 2, workers=3)
+            self.assertEqual(best.last_move[:2], ties[0])
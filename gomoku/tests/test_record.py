@@ -0,0 +1,73 @@
+# encoding: utf-8
+import io
+import os
+import tempfile
+import unittest
+from gomoku_lib.record import (
+    GameRecord, RecordWriter, RecordFile, read_records, HEADER, RECORD,
+    MAGIC, VERSION)
+from gomoku_lib.geometry import Geometry
+from gomoku_lib.constants import X_PLAYER
+from gomoku_lib.exceptions import InvalidRecord
+
+
+def pack_file(*records):
+    return HEADER.pack(MAGIC, VERSION) + b"".join(records)
+
+
+class ReadRecordsTest(unittest.TestCase):
+
+    def read_all(self, data):
+        """
+        Le as partidas de data pelos dois leitores e confere que eles
+        concordam
+        """
+        records = list(read_records(io.BytesIO(data)))
+        handle, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(handle, "wb") as output:
+                output.write(data)
+            with RecordFile(path) as mapped:
+                self.assertEqual(list(mapped), records)
+        finally:
+            os.remove(path)
+        return records
+
+    def assertInvalid(self, data):
+        with self.assertRaises(InvalidRecord):
+            list(read_records(io.BytesIO(data)))
+        handle, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(handle, "wb") as output:
+                output.write(data)
+            with self.assertRaises(InvalidRecord):
+                with RecordFile(path) as mapped:
+                    list(mapped)
+        finally:
+            os.remove(path)
+
+    def test_round_trip(self):
+        geometry = Geometry(9, 9, 4)
+        record = GameRecord.from_moves([(4, 4), (0, 0), (8, 8)], X_PLAYER,
+                                       geometry)
+        output = io.BytesIO()
+        RecordWriter(output).write(record)
+        self.assertEqual(self.read_all(output.getvalue()), [record])
+
+    def test_invalid_geometry(self):
+        for width, height, winning in ((0, 15, 5), (15, 0, 5), (15, 15, 0),
+                                       (15, 15, 2), (4, 4, 5)):
+            self.assertInvalid(pack_file(
+                RECORD.pack(width, height, winning, 0, 0)))
+
+    def test_invalid_winner(self):
+        self.assertInvalid(pack_file(RECORD.pack(15, 15, 5, 3, 0)))
+
+    def test_cell_outside_board(self):
+        # 225 eh a primeira casa fora do tabuleiro 15x15
+        self.assertInvalid(pack_file(
+            RECORD.pack(15, 15, 5, 0, 2) + bytes([112, 225])))
+
+    def test_repeated_cell(self):
+        self.assertInvalid(pack_file(
+            RECORD.pack(15, 15, 5, 0, 3) + bytes([112, 113, 112])))
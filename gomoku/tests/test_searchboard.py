@@ -0,0 +1,61 @@
+# encoding: utf-8
+import random
+import unittest
+from gomoku_lib.state import State
+from gomoku_lib.geometry import Geometry, DEFAULT_GEOMETRY
+from gomoku_lib.searchboard import SearchBoard
+from gomoku_lib.heuristic import evaluate as evaluate_heuristic
+from gomoku_lib.utility import evaluate as evaluate_utility
+from gomoku_lib.constants import X_PLAYER, O_PLAYER
+
+PLAYERS = (X_PLAYER, O_PLAYER)
+
+
+class EquivalenceTest(unittest.TestCase):
+    """
+    O SearchBoard deve concordar com o State em tudo que a busca usa: as
+    jogadas geradas (e a ordem delas), o zobrist, o fim do jogo, a
+    heuristica e a utilidade
+    """
+
+    def assertSame(self, board, state):
+        self.assertEqual(list(board.get_next_moves()),
+                         list(state.get_next_moves()))
+        self.assertEqual(board.zobrist, state.zobrist)
+        self.assertEqual(board.finished(), state.finished())
+        if not state.move_count:
+            return
+        for player in PLAYERS:
+            self.assertEqual(board.get_heuristic(player),
+                             evaluate_heuristic(player, state))
+            if state.finished():
+                self.assertEqual(board.get_utility(player),
+                                 evaluate_utility(player, state))
+
+    def play_games(self, geometry, games, length):
+        for seed in range(games):
+            rng = random.Random(seed)
+            state = State.get_initial_state(geometry)
+            board = SearchBoard(geometry)
+            for _ in range(length):
+                self.assertSame(board, state)
+                if state.finished():
+                    break
+                moves = list(state.get_next_moves())
+                # Alguns filhos com make_move e unmake_move
+                for move in moves[:3]:
+                    board.make_move(*move)
+                    self.assertSame(board, state.mark(*move))
+                    board.unmake_move()
+                self.assertSame(board, state)
+                move = rng.choice(moves[:6])
+                state = state.mark(*move)
+                board.make_move(*move)
+
+    def test_default_geometry(self):
+        self.play_games(DEFAULT_GEOMETRY, 10, 60)
+
+    def test_non_default_winning(self):
+        self.play_games(Geometry(9, 9, 4), 10, 40)
+        self.play_games(Geometry(19, 19, 6), 5, 60)
+        self.play_games(Geometry(7, 7, 3), 10, 30)
@@ -0,0 +1,64 @@
+# encoding: utf-8
+import unittest
+from gomoku_lib.state import State
+from gomoku_lib.geometry import Geometry
+from gomoku_lib.windows import FOUR, THREE, OPEN_THREE
+from gomoku_lib.constants import X_PLAYER, O_PLAYER
+from gomoku_lib.exceptions import InvalidGeometry
+
+
+def play_row(geometry, length):
+    """
+    O joga length pecas seguidas na linha 7, a partir da coluna 1, e X
+    responde na linha 9
+    """
+    moves = []
+    for x in range(1, length + 1):
+        moves.extend([(7, x), (9, x)])
+    return State.from_moves(moves[:2 * length - 1], geometry)
+
+
+class WinningTest(unittest.TestCase):
+
+    def test_game_finishes_with_non_default_winning(self):
+        for winning in (3, 4, 5, 6, 7):
+            geometry = Geometry(15, 15, winning)
+            state = play_row(geometry, winning - 1)
+            self.assertFalse(state.finished())
+            self.assertIn(state.get_forced_move(), [(7, 0), (7, winning)])
+            state = play_row(geometry, winning)
+            self.assertEqual(state.windows.winner, O_PLAYER)
+            self.assertTrue(state.check_won(O_PLAYER))
+            self.assertTrue(state.finished())
+            self.assertIsNone(state.get_forced_move())
+
+    def test_threats_follow_winning(self):
+        geometry = Geometry(19, 19, 6)
+        state = play_row(geometry, 4)
+        # Quatro pecas sao um THREE quando sao necessarias seis para vencer
+        self.assertEqual(state.count_threats(O_PLAYER, FOUR), 0)
+        self.assertTrue(state.count_threats(O_PLAYER, THREE))
+        self.assertTrue(state.count_threats(O_PLAYER, OPEN_THREE))
+        self.assertIsNone(state.get_forced_move())
+        state = play_row(geometry, 5)
+        self.assertTrue(state.count_threats(O_PLAYER, FOUR))
+        self.assertIn(state.get_forced_move(), [(7, 0), (7, 6)])
+
+    def test_invalid_geometry(self):
+        for width, height, winning in ((0, 15, 5), (15, 0, 5), (15, 15, 2),
+                                       (4, 4, 5)):
+            with self.assertRaises(InvalidGeometry):
+                Geometry(width, height, winning)
+
+
+class RewindTest(unittest.TestCase):
+
+    def test_rewind_keeps_clock_and_message(self):
+        state = State.from_moves([(7, 7), (7, 6), (6, 6), (5, 5)])
+        state = state._replace(started_at=123.0).display("hello")
+        rewound = state.rewind(2)
+        self.assertEqual(rewound.get_moves(), [(7, 7), (7, 6)])
+        self.assertEqual(rewound.started_at, 123.0)
+        self.assertEqual(rewound.message, "hello")
+        self.assertEqual(rewound.zobrist,
+                         State.from_moves([(7, 7), (7, 6)]).zobrist)
@@ -0,0 +1,45 @@
+# encoding: utf-8
+import unittest
+from gomoku_lib.state import State
+from gomoku_lib.threats import ThreatBoard, find_vcf, find_vct
+from gomoku_lib.constants import O_PLAYER
+
+
+def play(o_moves, x_moves):
+    moves = []
+    for o_move, x_move in zip(o_moves, x_moves):
+        moves.extend([o_move, x_move])
+    return State.from_moves(moves)
+
+
+class ThreatSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        # O tem dois tres bloqueados que se cruzam em (7, 8)
+        self.state = play(
+            [(7, 4), (7, 5), (7, 6), (4, 8), (5, 8), (6, 8)],
+            [(7, 3), (3, 8), (0, 0), (0, 14), (14, 0), (14, 14)])
+
+    def test_board_follows_state(self):
+        board = ThreatBoard.from_state(self.state)
+        state = self.state
+        for move in [(7, 7), (7, 8), (8, 8)]:
+            board = board.mark(*move)
+            state = state.mark(*move)
+            self.assertEqual(board.zobrist, state.zobrist)
+            self.assertEqual(board.player, state.player)
+            self.assertEqual(board.windows.threats, state.windows.threats)
+
+    def test_finds_forced_win(self):
+        for find in (find_vcf, find_vct):
+            line = find(self.state)
+            self.assertIsNotNone(line)
+            state = self.state
+            for move in line:
+                state = state.mark(*move)
+            self.assertEqual(state.windows.winner, O_PLAYER)
+
+    def test_no_win_without_threats(self):
+        state = State.from_moves([(7, 7), (0, 0)])
+        self.assertIsNone(find_vcf(state))
+        self.assertIsNone(find_vct(state))
@@ -0,0 +1,91 @@
+# encoding: utf-8
+import random
+import threading
+import unittest
+from gomoku_lib.state import State
+from gomoku_lib.geometry import Geometry
+from gomoku_lib.minimax import search_root, iterative_deepening
+from gomoku_lib.negamax import principal_variation
+from gomoku_lib.transposition import TranspositionTable, Entry, get_bound, \
+    EXACT, LOWER_BOUND, UPPER_BOUND
+
+inf = float('inf')
+
+
+class BoundTest(unittest.TestCase):
+
+    def test_get_bound(self):
+        self.assertEqual(get_bound(0, 0, 10), UPPER_BOUND)
+        self.assertEqual(get_bound(5, 0, 10), EXACT)
+        self.assertEqual(get_bound(10, 0, 10), LOWER_BOUND)
+
+    def test_is_usable(self):
+        self.assertTrue(Entry(5, 2, EXACT, None).is_usable(2, 10, 20))
+        self.assertFalse(Entry(5, 1, EXACT, None).is_usable(2, -inf, inf))
+        # Um limite inferior so corta se ja passa de beta
+        self.assertTrue(Entry(10, 2, LOWER_BOUND, None).is_usable(2, 0, 10))
+        self.assertFalse(Entry(10, 2, LOWER_BOUND, None).is_usable(2, 0, 11))
+        # Um limite superior so corta se nao passa de alpha
+        self.assertTrue(Entry(0, 2, UPPER_BOUND, None).is_usable(2, 0, 10))
+        self.assertFalse(Entry(0, 2, UPPER_BOUND, None).is_usable(2, -1, 10))
+
+    def test_store_keeps_deeper_exact(self):
+        table = TranspositionTable()
+        table.store("key", 5, 3, EXACT, (1, 1))
+        table.store("key", 7, 1, LOWER_BOUND, (2, 2))
+        self.assertEqual(table.get("key"), Entry(5, 3, EXACT, (1, 1)))
+        table.store("key", 9, 4, UPPER_BOUND)
+        # Sem jogada nova, a melhor jogada anterior eh mantida
+        self.assertEqual(table.get("key"), Entry(9, 4, UPPER_BOUND, (1, 1)))
+
+    def test_size_limit(self):
+        table = TranspositionTable(size=2)
+        for key in ("a", "b", "c"):
+            table.store(key, 0, 1, EXACT)
+        self.assertIsNone(table.get("a"))
+        self.assertEqual(len(table), 2)
+
+
+class SearchTest(unittest.TestCase):
+    """
+    Com a tabela, as buscas devem chegar ao mesmo valor que sem ela, mesmo
+    reaproveitando a tabela entre profundidades e entre janelas diferentes
+    (como no aprofundamento iterativo com janelas de aspiracao)
+    """
+
+    def get_positions(self):
+        geometry = Geometry(9, 9, 4)
+        for seed in range(3):
+            rng = random.Random(seed)
+            state = State.get_initial_state(geometry)
+            for _ in range(rng.randrange(3, 12)):
+                state = state.mark(
+                    *rng.choice(list(state.get_next_moves())[:6]))
+            yield state
+
+    def test_same_value_with_table(self):
+        for search in (search_root, principal_variation):
+            for state in self.get_positions():
+                player = state.player
+                table = TranspositionTable()
+                for depth in (1, 2, 3):
+                    expected, _ = search(player, state, depth, -inf, inf)
+                    # Janelas estreitas, com o valor dentro e fora delas,
+                    # deixam limites inferiores e superiores na tabela
+                    for alpha, beta in ((expected + 1, expected + 2),
+                                        (expected - 2, expected - 1),
+                                        (expected - 1, expected + 1)):
+                        search(player, state, depth, alpha, beta, table)
+                    value, _ = search(player, state, depth, -inf, inf, table)
+                    self.assertEqual(value, expected)
+
+    def test_cancel_keeps_first_iteration(self):
+        # Cancelada antes de comecar, a busca ainda completa a profundidade 1
+        cancel = threading.Event()
+        cancel.set()
+        for state in self.get_positions():
+            player = state.player
+            expected = search_root(player, state, 1, -inf, inf)
+            result = iterative_deepening(player, state, 10, cancel=cancel)
+            self.assertEqual(result[0], expected[0])
+            self.assertEqual(result[1].last_move, expected[1].last_move)